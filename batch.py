@@ -0,0 +1,202 @@
+#!/usr/bin/python
+
+__doc__ = '''Parallel batch compilation
+Compiles many PL/0 programs on a pool of worker processes, one .s file per source,
+and prints a summary of the timings and of the failures.
+A compilation is stopped after a timeout by an alarm in its worker; the jobs
+of a worker that dies or does not answer are recorded as failed, once no job
+has finished for the timeout and a grace period.
+Usage: python2 batch.py [-j JOBS] [-d OUTDIR] [--report FILE] [--timeout SECONDS] source_or_directory ...'''
+
+import json
+import math
+import os
+import signal
+import sys
+import time
+import traceback
+from multiprocessing import Pool, cpu_count
+
+SOURCE_EXTENSION = '.pl0'
+# seconds a compilation may take
+TIMEOUT = 60
+# seconds without any finished job before the pending ones are given up
+GRACE = 5
+# seconds between two looks at the pending jobs
+POLL = 0.1
+
+
+class CompileTimeout(Exception):
+    pass
+
+
+def on_alarm(signum, frame):
+    raise CompileTimeout()
+
+
+def init_worker():
+    signal.signal(signal.SIGALRM, on_alarm)
+
+
+def collect_sources(paths, outdir=None):
+    '''Return the (source, output) pairs for the given files and directories
+    Directories are searched recursively; with outdir the outputs mirror the tree there,
+    otherwise every .s file is written next to its source.'''
+    jobs = []
+
+    def output_for(source, relative):
+        base = os.path.splitext(relative)[0] + '.s'
+        if outdir is None:
+            return os.path.splitext(source)[0] + '.s'
+        return os.path.join(outdir, base)
+
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith(SOURCE_EXTENSION):
+                        source = os.path.join(root, name)
+                        jobs.append((source, output_for(source, os.path.relpath(source, path))))
+        else:
+            jobs.append((path, output_for(path, os.path.basename(path))))
+    return jobs
+
+
+def compile_job(job, timeout=TIMEOUT):
+    '''Worker: compile one (source, output[, cache directory]) job, never raises
+    The compilation is stopped after timeout seconds (never with 0).'''
+    from pipeline import compile_file
+
+    source, output = job[:2]
+    options = dict()
+    if len(job) > 2 and job[2] is not None:
+        from cache import CompilationCache
+        options['cache'] = CompilationCache(job[2])
+    start = time.time()
+    cpu = time.clock()
+    if timeout:
+        signal.alarm(int(math.ceil(timeout)))
+    try:
+        directory = os.path.dirname(output)
+        if directory and not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:  # created by another worker
+                pass
+        compile_file(source, output, **options)
+        return dict(source=source, output=output, ok=True, seconds=time.time() - start,
+                    cpu_seconds=time.clock() - cpu)
+    except CompileTimeout:
+        return dict(source=source, output=output, ok=False, seconds=time.time() - start,
+                    cpu_seconds=time.clock() - cpu, error="compilation timed out after %g seconds" % timeout)
+    except Exception, e:
+        return dict(source=source, output=output, ok=False, seconds=time.time() - start,
+                    cpu_seconds=time.clock() - cpu,
+                    error=traceback.format_exception_only(type(e), e)[-1].strip().replace("\n", "; "))
+    finally:
+        signal.alarm(0)
+
+
+def lost_job(job, waited):
+    '''Result of a job whose worker died or did not answer, its CPU time is unknown'''
+    return dict(source=job[0], output=job[1], ok=False, seconds=waited, cpu_seconds=0.0,
+                error="no answer from the worker after %.0f seconds" % waited)
+
+
+def compile_all(jobs, processes=None, maxtasksperchild=100, timeout=TIMEOUT):
+    '''Compile the jobs (see compile_job) on a process pool, return one result per job
+    Workers are recycled after maxtasksperchild compilations, so that the state
+    accumulated by the compiler modules does not grow without bounds. A job
+    lost with its worker never finishes: when no job has finished for timeout
+    and GRACE seconds, the pending ones are recorded as failed.'''
+    if processes == 1:
+        init_worker()
+        return [compile_job(job, timeout) for job in jobs]
+
+    pool = Pool(processes or cpu_count(), initializer=init_worker, maxtasksperchild=maxtasksperchild)
+    results = []
+    try:
+        pending = [(job, pool.apply_async(compile_job, (job, timeout))) for job in jobs]
+        progress = time.time()
+        while pending:
+            waiting = []
+            for job, result in pending:
+                if result.ready():
+                    results.append(result.get())
+                    progress = time.time()
+                else:
+                    waiting.append((job, result))
+            pending = waiting
+            if not pending:
+                break
+            waited = time.time() - progress
+            if timeout and waited > timeout + GRACE:
+                results.extend(lost_job(job, waited) for job, result in pending)
+                # stuck workers would never join
+                pool.terminate()
+                break
+            pending[0][1].wait(POLL)
+        return results
+    finally:
+        pool.close()
+        pool.join()
+
+
+def summary(results, wall):
+    '''Aggregate the results of compile_all'''
+    failures = [r for r in results if not r['ok']]
+    return dict(
+        files=len(results),
+        compiled=len(results) - len(failures),
+        failed=len(failures),
+        wall_seconds=wall,
+        cpu_seconds=sum(r['cpu_seconds'] for r in results),
+        slowest=sorted(results, key=lambda r: r['seconds'], reverse=True)[:10],
+        failures=failures,
+        results=results,
+    )
+
+
+def print_summary(report):
+    print("Compiled %d of %d files in %.2fs (%.2fs of CPU in the compilations)" %
+          (report['compiled'], report['files'], report['wall_seconds'], report['cpu_seconds']))
+    if report['slowest']:
+        print("Slowest:")
+        for r in report['slowest']:
+            print("\t%8.3fs  %s" % (r['seconds'], r['source']))
+    if report['failures']:
+        print("Failures:")
+        for r in report['failures']:
+            print("\t%s: %s" % (r['source'], r['error']))
+
+
+def main(argv):
+    import argparse
+
+    argparser = argparse.ArgumentParser(description="Compile PL/0 programs in parallel")
+    argparser.add_argument("sources", nargs="+", help=".pl0 files or directories holding them")
+    argparser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (all CPUs by default)")
+    argparser.add_argument("-d", "--outdir", default=None, help="directory of the .s files (next to the sources by default)")
+    argparser.add_argument("--report", metavar="FILE", help="write the summary as JSON to FILE")
+    argparser.add_argument("--cache", metavar="DIR", help="reuse the assembly of unchanged programs cached in DIR")
+    argparser.add_argument("--timeout", type=float, default=TIMEOUT, metavar="SECONDS",
+                           help="seconds a compilation may take, 0 for no limit (%(default)g by default)")
+    args = argparser.parse_args(argv)
+
+    jobs = [(source, output, args.cache) for source, output in collect_sources(args.sources, args.outdir)]
+
+    start = time.time()
+    results = compile_all(jobs, args.jobs, timeout=args.timeout)
+    report = summary(results, time.time() - start)
+
+    print_summary(report)
+    if args.report:
+        with open(args.report, "w") as fout:
+            json.dump(report, fout, indent=2)
+
+    return 1 if report['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
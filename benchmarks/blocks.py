@@ -0,0 +1,103 @@
+#!/usr/bin/python
+
+__doc__ = '''CFG construction benchmark on long straight-line bodies
+Builds the CFG of programs whose main body is one statement list of n
+statements: calls only, one call every few assignments, or if statements in
+sequence. Every call and every branch ends a basic block, so the body is cut
+into about n blocks; the construction should take a time proportional to n.
+The program is parsed and its symbol table built outside of the measure.
+Usage: python2 benchmarks/blocks.py [--max-statements N] [--shape SHAPE]'''
+
+import gc
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scaling import growth
+
+HEAD = 'VAR a;\nPROCEDURE p;\nBEGIN a := 1 END;\nBEGIN\na := 0;\n'
+TAIL = 'a := 2\nEND.\n'
+
+
+def calls(count):
+    return HEAD + 'CALL p;\n' * count + TAIL
+
+
+def mixed(count):
+    return HEAD + 'a := a + 1;\na := a * 2;\na := a - 3;\nCALL p;\n' * (count // 4) + TAIL
+
+
+def branches(count):
+    return HEAD + 'IF a < 1 THEN BEGIN a := 1 END ELSE BEGIN a := 2 END;\n' * count + TAIL
+
+
+SHAPES = (
+    ('calls', calls),
+    ('mixed', mixed),
+    ('branches', branches),
+)
+
+
+def build(source):
+    '''Seconds to build the CFG of source and its number of blocks, or the
+    error that stopped the construction'''
+    from cfg import CFG
+    from frontend import PARSERS
+    from ir import SymbolTable
+    from lexer import positioned_lexer
+    from pipeline import PARSING
+    from tokenbuffer import TokenBuffer
+
+    tree = PARSERS[PARSING](TokenBuffer(positioned_lexer(source))).program()
+    SymbolTable(tree)
+    gc.collect()
+    start = time.time()
+    try:
+        cfg = CFG(tree)
+    except RuntimeError, e:
+        return None, str(e)
+    elapsed = time.time() - start
+    return elapsed, sum(len(blocks) for blocks in cfg.BB_list.values())
+
+
+def sizes(maximum):
+    count = 1000
+    while count <= maximum:
+        yield count
+        count *= 2
+
+
+def main(argv):
+    import argparse
+
+    argparser = argparse.ArgumentParser(description="CFG construction benchmark")
+    argparser.add_argument("--max-statements", type=int, default=64000)
+    argparser.add_argument("--shape", action="append", choices=[n for n, f in SHAPES],
+                           help="body of the program (all of them by default)")
+    args = argparser.parse_args(argv)
+
+    for name, make in SHAPES:
+        if args.shape and name not in args.shape:
+            continue
+        print("\n%s" % name)
+        print("%10s %10s %10s %12s" % ('statements', 'blocks', 'seconds', 'us per stat'))
+        counts, times = [], []
+        for count in sizes(args.max_statements):
+            elapsed, blocks = build(make(count))
+            if elapsed is None:
+                print("%10d failed: %s" % (count, blocks))
+                break
+            counts.append(count)
+            times.append(elapsed)
+            print("%10d %10d %10.3f %12.1f" % (count, blocks, elapsed, elapsed / count * 1e6))
+        exponent = growth(counts, times)
+        if exponent is not None:
+            print("growth exponent %.2f" % exponent)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,175 @@
+#!/usr/bin/python
+
+__doc__ = '''Seeded generator of valid PL/0 programs
+The shape of the programs is tunable: number of procedures and their nesting
+depth, variables per scope, statements per body (the nested ones included),
+length of the expressions, and density of while loops, if statements and calls.
+The same seed and shape always give the same program.
+The programs stay within what the compiler supports: every statement list
+starts and ends with an assignment, if statements always have an else part,
+the branches and the loop bodies are BEGIN ... END blocks, and conditions
+compare a variable with a variable or a number.
+Usage: python2 benchmarks/generator.py [--seed N] [--procedures N] ... > program.pl0'''
+
+import random
+import sys
+
+DEFAULT_SHAPE = dict(
+    procedures=4,
+    depth=2,
+    variables=4,
+    statements=8,
+    expression=3,
+    loops=0.15,
+    branches=0.15,
+    calls=0.15,
+)
+
+RELATIONS = ('=', '<', '>', '<=', '>=')
+OPERATORS = ('+', '-', '*')
+
+
+class Scope(object):
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.children = []
+        self.variables = []
+        self.depth = 0 if parent is None else parent.depth + 1
+
+    def visible_variables(self):
+        scope, res = self, []
+        while scope is not None:
+            res.extend(scope.variables)
+            scope = scope.parent
+        return res
+
+    def visible_procedures(self):
+        '''The procedures that can be called from the body: the nested ones and
+        the ones declared before each enclosing procedure (no recursion)'''
+        res = [c.name for c in self.children]
+        scope = self
+        while scope.parent is not None:
+            siblings = scope.parent.children
+            res.extend(c.name for c in siblings[:siblings.index(scope)])
+            scope = scope.parent
+        return res
+
+
+class Generator(object):
+    def __init__(self, seed=0, **shape):
+        self.random = random.Random(seed)
+        self.shape = dict(DEFAULT_SHAPE)
+        for key, value in shape.items():
+            if key not in DEFAULT_SHAPE:
+                raise ValueError("unknown shape parameter " + key)
+            self.shape[key] = value
+
+    def program(self):
+        root = Scope('main')
+        scopes = [root]
+        for i in range(self.shape['procedures']):
+            parents = [s for s in scopes if s.depth < self.shape['depth']] or [root]
+            parent = self.random.choice(parents)
+            scope = Scope('p%d' % i, parent)
+            parent.children.append(scope)
+            scopes.append(scope)
+        for i, scope in enumerate(scopes):
+            scope.variables = ['v%d_%d' % (i, k) for k in range(max(1, self.shape['variables']))]
+
+        lines = []
+        self.block(root, lines, '')
+        lines[-1] += '.'
+        return '\n'.join(lines) + '\n'
+
+    def block(self, scope, lines, indent):
+        lines.append(indent + 'VAR ' + ', '.join(scope.variables) + ';')
+        for child in scope.children:
+            lines.append(indent + 'PROCEDURE ' + child.name + ';')
+            self.block(child, lines, indent + '  ')
+            lines[-1] += ';'
+        lines.append(indent + 'BEGIN')
+        self.statements(scope, self.shape['statements'], lines, indent + '  ', 0)
+        lines.append(indent + 'END')
+
+    def statements(self, scope, count, lines, indent, nesting):
+        '''Append a list of count statements, the nested ones included'''
+        body = [self.assignment(scope)]
+        remaining = count - 2
+        while remaining > 0:
+            statement, size = self.statement(scope, remaining, indent, nesting)
+            body.append(statement)
+            remaining -= size
+        if count > 1:
+            body.append(self.assignment(scope))
+        for i, statement in enumerate(body):
+            lines.append(indent + statement + (';' if i < len(body) - 1 else ''))
+
+    def statement(self, scope, budget, indent, nesting):
+        '''Return a statement of at most budget statements, and its size'''
+        r = self.random.random()
+        shape = self.shape
+        if nesting < 3 and budget >= 2 and r < shape['loops']:
+            inner = self.random.randint(1, min(4, budget - 1))
+            lines = []
+            self.statements(scope, inner, lines, indent + '  ', nesting + 1)
+            return 'WHILE ' + self.condition(scope) + ' DO\n' + indent + 'BEGIN\n' + \
+                '\n'.join(lines) + '\n' + indent + 'END', 1 + inner
+        r -= shape['loops']
+        if nesting < 3 and budget >= 3 and r < shape['branches']:
+            inner = self.random.randint(1, min(4, (budget - 1) // 2))
+            then_part, else_part = [], []
+            self.statements(scope, inner, then_part, indent + '  ', nesting + 1)
+            self.statements(scope, inner, else_part, indent + '  ', nesting + 1)
+            return 'IF ' + self.condition(scope) + ' THEN\n' + indent + 'BEGIN\n' + \
+                '\n'.join(then_part) + '\n' + indent + 'END\n' + indent + 'ELSE\n' + indent + 'BEGIN\n' + \
+                '\n'.join(else_part) + '\n' + indent + 'END', 1 + 2 * inner
+        r -= shape['branches']
+        procedures = scope.visible_procedures()
+        if procedures and r < shape['calls']:
+            return 'CALL ' + self.random.choice(procedures), 1
+        return self.assignment(scope), 1
+
+    def assignment(self, scope):
+        return self.random.choice(scope.visible_variables()) + ' := ' + self.expression(scope)
+
+    def operand(self, scope):
+        if self.random.random() < 0.3:
+            return str(self.random.randint(0, 100))
+        return self.random.choice(scope.visible_variables())
+
+    def expression(self, scope):
+        terms = [self.operand(scope)]
+        for i in range(max(0, self.shape['expression'] - 1)):
+            terms.append(self.random.choice(OPERATORS))
+            terms.append(self.operand(scope))
+        return ' '.join(terms)
+
+    def condition(self, scope):
+        if self.random.random() < 0.1:
+            return 'ODD ' + self.random.choice(scope.visible_variables())
+        return self.random.choice(scope.visible_variables()) + ' ' + self.random.choice(RELATIONS) + ' ' + \
+            self.operand(scope)
+
+
+def generate(seed=0, **shape):
+    '''Return the text of a program, see DEFAULT_SHAPE for the parameters'''
+    return Generator(seed, **shape).program()
+
+
+def main(argv):
+    import argparse
+
+    argparser = argparse.ArgumentParser(description="Generate a PL/0 program")
+    argparser.add_argument("--seed", type=int, default=0)
+    for key, value in sorted(DEFAULT_SHAPE.items()):
+        argparser.add_argument("--" + key, type=type(value), default=value)
+    args = argparser.parse_args(argv)
+
+    shape = dict((key, getattr(args, key)) for key in DEFAULT_SHAPE)
+    sys.stdout.write(generate(args.seed, **shape))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,240 @@
+#!/usr/bin/python
+
+__doc__ = '''Per-pass microbenchmarks
+Times the hot entry points of the compiler one at a time on fixed fixtures:
+the passes before the measured one are run untimed to build its input, again
+for every repetition since most passes modify the IR in place.
+The passes are run in rounds, the best time of every (pass, fixture) pair is compared with the committed
+baseline (benchmarks/baseline.json); the run fails when a pass is slower than
+its baseline by more than the threshold (and by more than two milliseconds, the
+timings of the small fixtures are mostly noise). Every timing of the baseline
+also records the best time of a fixed pure Python loop when it was measured,
+used to scale it to the speed of the current machine: --update --pass NAME
+rewrites the timings of NAME only, the others keep their own calibration.
+Usage: python2 benchmarks/micro.py [--threshold PERCENT] [--update] [--pass NAME ...]'''
+
+import gc
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generator import generate
+
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+# name -> source; the generated ones are fixed by their seed
+FIXTURES = (
+    ('test1', lambda: open(os.path.join(ROOT, 'test1.pl0')).read()),
+    ('medium', lambda: generate(1, procedures=16, statements=32)),
+    ('large', lambda: generate(2, procedures=32, depth=3, statements=64)),
+)
+
+
+def run_lexer(state):
+    from lexer import lexer
+    state['words'] = list(lexer(state['source']))
+
+
+def run_parser(state):
+    from frontend import PARSERS
+    from pipeline import PARSING
+    state['ir'] = PARSERS[PARSING](state.pop('tokens')).program()
+
+
+def run_constant_propagation(state):
+    from support import constant_propagation
+    state['ir'].navigate(constant_propagation)
+
+
+def run_constant_folding(state):
+    from support import constant_folding
+    state['ir'].navigate_postvisit(constant_folding)
+
+
+def run_cfg(state):
+    from cfg import CFG
+    state['cfg'] = CFG(state['ir'])
+
+
+def run_call_graph(state):
+    from call_graph import CallGraph
+    from datalayout import data_layout
+    state['call_graph'] = CallGraph(state['cfg'], state['symtab'])
+    # the layout is cheap and needed by the code generation only
+    data_layout(state['symtab'], state['call_graph'])
+
+
+def run_three_addr_form(state):
+    state['cfg'].three_addr_form()
+
+
+def run_liveness(state):
+    state['liveness'] = state['cfg'].liveness_graphs()
+
+
+def run_register_allocation(state):
+    from register_alloc import RegisterAllocator
+    RegisterAllocator(state['liveness'], state['cfg'])
+
+
+def run_code_generation(state):
+    state['assembly'] = state['cfg'].code_generation()
+
+
+# in pipeline order: each pass runs on the results of the ones before it
+PASSES = (
+    ('lexer', run_lexer),
+    ('parser', run_parser),
+    ('constant_propagation', run_constant_propagation),
+    ('constant_folding', run_constant_folding),
+    ('cfg', run_cfg),
+    ('call_graph', run_call_graph),
+    ('three_addr_form', run_three_addr_form),
+    ('liveness', run_liveness),
+    ('register_allocation', run_register_allocation),
+    ('code_generation', run_code_generation),
+)
+
+# untimed work before a pass: the tokens are buffered before the parser starts,
+# the symbol table is built before the CFG
+SETUP = {
+    'parser': lambda state: state.update(tokens=buffered_tokens(state['source'])),
+    'cfg': lambda state: state.update(symtab=symbol_table(state['ir'])),
+}
+
+
+def buffered_tokens(source):
+    from lexer import positioned_lexer
+    from tokenbuffer import TokenBuffer
+    return TokenBuffer(positioned_lexer(source))
+
+
+def symbol_table(ir):
+    from ir import SymbolTable
+    return SymbolTable(ir)
+
+
+def prepare(source, name):
+    '''Return the state on which the pass name runs'''
+    state = dict(source=source)
+    for other, run in PASSES:
+        if other in SETUP:
+            SETUP[other](state)
+        if other == name:
+            return state
+        # the parser reads its own tokens, the words of the lexer are not used
+        if other != 'lexer':
+            run(state)
+
+
+def measure(source, name):
+    '''Time of one run of the pass name, without garbage collections'''
+    run = dict(PASSES)[name]
+    state = prepare(source, name)
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.time()
+        run(state)
+        return time.time() - start
+    finally:
+        gc.enable()
+
+
+def calibrate(repeat=5):
+    '''Best time of a fixed pure Python loop, a measure of the machine speed'''
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        d = dict()
+        for k in xrange(1000000):
+            d[k & 1023] = d.get(k & 511, 0) + k
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def load_baseline(filename):
+    import json
+    try:
+        with open(filename) as fin:
+            return json.load(fin)
+    except IOError:
+        return None
+
+
+def main(argv):
+    import argparse
+    import json
+
+    argparser = argparse.ArgumentParser(description="Per-pass microbenchmarks of the compiler")
+    argparser.add_argument("--pass", dest="passes", action="append", choices=[n for n, r in PASSES],
+                           help="pass to measure (all of them by default)")
+    argparser.add_argument("-n", "--repeat", type=int, default=10, help="rounds of runs of every pass, the best time is kept")
+    argparser.add_argument("--threshold", type=float, default=25.0,
+                           help="percentage over the baseline that counts as a regression")
+    argparser.add_argument("--noise", type=float, default=2.0, metavar="MS",
+                           help="slowdowns below this many milliseconds are never regressions")
+    argparser.add_argument("--baseline", default=BASELINE, help="baseline file")
+    argparser.add_argument("--update", action="store_true", help="write the measures as the new baseline")
+    args = argparser.parse_args(argv)
+
+    sys.setrecursionlimit(10000)
+    names = args.passes or [n for n, r in PASSES]
+    sources = [(fixture, read()) for fixture, read in FIXTURES]
+    # every round runs each pass once and samples the machine speed, the best
+    # times are kept: a slow spell of the machine spoils a round, not a pass
+    speed = calibrate()
+    results = dict()
+    for i in range(args.repeat):
+        for fixture, source in sources:
+            for name in names:
+                key = name + '/' + fixture
+                elapsed = measure(source, name)
+                if key not in results or elapsed < results[key]:
+                    results[key] = elapsed
+        speed = min(speed, calibrate(1))
+
+    if args.update:
+        baseline = load_baseline(args.baseline) or dict(timings=dict())
+        for key, seconds in results.items():
+            baseline['timings'][key] = dict(seconds=seconds, calibration=speed)
+        with open(args.baseline, "w") as fout:
+            json.dump(baseline, fout, indent=2, sort_keys=True)
+        print("baseline written to " + args.baseline)
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print("no baseline in " + args.baseline + ", run with --update")
+        baseline = dict(timings=dict())
+
+    regressions = []
+    print("%-32s %10s %10s %8s" % ('pass/fixture', 'ms', 'baseline', 'change'))
+    for key in sorted(results, key=lambda k: (k.split('/')[1], names.index(k.split('/')[0]))):
+        current = results[key]
+        entry = baseline['timings'].get(key)
+        if entry is None:
+            print("%-32s %10.2f %10s %8s" % (key, current * 1000, '-', '-'))
+            continue
+        # scaled by the speed of the machine now and when it was measured
+        reference = entry['seconds'] * speed / entry['calibration']
+        change = (current - reference) / reference * 100
+        flag = ''
+        if change > args.threshold and current - reference > args.noise / 1000:
+            regressions.append(key)
+            flag = '  REGRESSION'
+        print("%-32s %10.2f %10.2f %+7.1f%%%s" % (key, current * 1000, reference * 1000, change, flag))
+
+    if regressions:
+        print("%d passes regressed by more than %g%%: %s" % (len(regressions), args.threshold,
+                                                            ", ".join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
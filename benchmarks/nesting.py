@@ -0,0 +1,123 @@
+#!/usr/bin/python
+
+__doc__ = '''Nesting depth benchmark of the parsers
+Lexes and parses programs made of one construct nested depth times (begin/end
+blocks, if/else chains, while loops, parentheses, procedures) with each parser
+of frontend.PARSERS. The recursive parser stops at the recursion limit; the
+iterative and the table-driven ones should take a time proportional to the depth.
+Usage: python2 benchmarks/nesting.py [--max-depth N] [--mode MODE]'''
+
+import gc
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scaling import growth
+
+
+def nested_blocks(depth):
+    return 'VAR a;\nBEGIN\n' + 'BEGIN a := 1;\n' * depth + 'a := 2' + '\nEND' * depth + '\nEND.\n'
+
+
+def nested_ifs(depth):
+    return 'VAR a;\nBEGIN\n' + 'IF a < 1 THEN a := 1 ELSE\n' * depth + 'a := 2\nEND.\n'
+
+
+def nested_whiles(depth):
+    return 'VAR a;\nBEGIN\n' + 'WHILE a < 1 DO\n' * depth + 'a := a + 1\nEND.\n'
+
+
+def nested_parentheses(depth):
+    return 'VAR a;\nBEGIN\na := ' + '(a + ' * depth + '1' + ')' * depth + '\nEND.\n'
+
+
+def nested_procedures(depth):
+    # every body uses the variable of its own procedure: the lookups stay local
+    head = ''.join('PROCEDURE p%d;\nVAR v%d;\n' % (i, i) for i in range(depth))
+    bodies = ''.join('v%d := 1;\n' % i for i in reversed(range(depth)))
+    return 'VAR a;\n' + head + bodies + 'a := 1.\n'
+
+
+SHAPES = (
+    ('blocks', nested_blocks),
+    ('ifs', nested_ifs),
+    ('whiles', nested_whiles),
+    ('parentheses', nested_parentheses),
+    ('procedures', nested_procedures),
+)
+
+
+def parse(source, mode):
+    '''Seconds to lex and parse source, or the error that stopped the parser'''
+    from frontend import PARSERS
+    from lexer import positioned_lexer
+    from tokenbuffer import TokenBuffer
+
+    gc.collect()
+    start = time.time()
+    try:
+        parser = PARSERS[mode](TokenBuffer(positioned_lexer(source)))
+        tree = parser.program()
+    except RuntimeError, e:
+        return None, str(e)
+    elapsed = time.time() - start
+    if parser.errors:
+        return None, parser.errors[0]
+    # the tree is released outside of the measure
+    del tree
+    return elapsed, None
+
+
+def depths(maximum):
+    depth = 100
+    while depth <= maximum:
+        yield depth
+        yield 3 * depth
+        depth *= 10
+
+
+def main(argv):
+    import argparse
+    from frontend import PARSERS
+
+    argparser = argparse.ArgumentParser(description="Nesting depth benchmark of the parsers")
+    argparser.add_argument("--max-depth", type=int, default=100000)
+    argparser.add_argument("--mode", action="append", choices=sorted(PARSERS),
+                           help="parsing mode (all of them by default)")
+    argparser.add_argument("--shape", action="append", choices=[n for n, f in SHAPES],
+                           help="nested construct (all of them by default)")
+    args = argparser.parse_args(argv)
+
+    for name, make in SHAPES:
+        if args.shape and name not in args.shape:
+            continue
+        for mode in args.mode or sorted(PARSERS):
+            print("\n%s, %s parser" % (name, mode))
+            print("%10s %10s %12s" % ('depth', 'seconds', 'us per level'))
+            sizes, times = [], []
+            failed = False
+            for depth in depths(args.max_depth):
+                if depth > args.max_depth:
+                    break
+                elapsed, error = parse(make(depth), mode)
+                if error is not None:
+                    print("%10d failed: %s" % (depth, error))
+                    failed = True
+                    break
+                sizes.append(depth)
+                times.append(elapsed)
+                print("%10d %10.3f %12.1f" % (depth, elapsed, elapsed / depth * 1e6))
+            # the first depths are too cheap to fit a failed run on
+            if failed and len(sizes) < 3:
+                continue
+            exponent = growth(sizes, times)
+            if exponent is not None:
+                print("growth exponent %.2f" % exponent)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,183 @@
+#!/usr/bin/python
+
+__doc__ = '''End-to-end scaling benchmark
+Compiles generated programs of growing size along one shape parameter at a time
+(see generator.py) and records the time and the memory of every phase.
+Each compilation runs in a fresh process, so that the peak resident size is
+the one of that program alone. The growth exponent of a phase is the slope of
+log(time) over log(source bytes): about 1 for linear passes, 2 for quadratic ones.
+It is not computed when the source barely grows (depth only moves the code around).
+A compilation whose process dies, or runs longer than --timeout seconds, is
+recorded as a failed run.
+Usage: python2 benchmarks/scaling.py [--dimension NAME ...] [--steps N] [--timeout SECONDS] [--json FILE]'''
+
+import math
+import os
+import sys
+import time
+from multiprocessing import Process, Queue
+from Queue import Empty
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generator import generate
+
+# dimension -> (first value, fixed shape parameters), the value doubles at each step
+SUITE = {
+    'procedures': (4, dict()),
+    'statements': (8, dict()),
+    'depth': (1, dict(procedures=32)),
+    'variables': (4, dict()),
+    'expression': (2, dict()),
+    'loops': (0.05, dict(statements=32)),
+}
+
+# exponents above this are reported as superlinear
+SUPERLINEAR = 1.3
+# the growth is only fitted when the largest source is at least this many times the smallest
+MIN_SPAN = 1.5
+# seconds a compilation may take before its process is killed
+TIMEOUT = 600
+# seconds between two checks that the child process is still alive
+POLL = 1
+
+
+def compile_generated(shape, seed, census, queue):
+    '''Child process: compile a generated program, put the report on the queue'''
+    import traceback
+    from pipeline import compile_text
+    from metrics import PhaseReport
+
+    source = ''
+    report = PhaseReport(memory=True, census=census)
+    try:
+        source = generate(seed, **shape)
+        compile_text(source, report=report)
+        result = dict(ok=True)
+    except Exception, e:
+        result = dict(ok=False, error=traceback.format_exception_only(type(e), e)[-1].strip())
+    result.update(report.as_dict(), shape=shape, seed=seed, source_bytes=len(source),
+                  source_lines=source.count('\n'))
+    queue.put(result)
+
+
+def failed_run(shape, seed, error):
+    return dict(ok=False, error=error, shape=shape, seed=seed, source_bytes=0, source_lines=0,
+                wall_seconds=0.0, cpu_seconds=0.0, phases=[])
+
+
+def measure(shape, seed=0, census=False, timeout=TIMEOUT):
+    '''Report of the compilation in a child process, a failed run if the
+    child dies without one or runs longer than timeout seconds'''
+    queue = Queue()
+    child = Process(target=compile_generated, args=(shape, seed, census, queue))
+    child.start()
+    deadline = time.time() + timeout
+    result = None
+    while result is None:
+        try:
+            result = queue.get(timeout=POLL)
+        except Empty:
+            if not child.is_alive():
+                # the report may have been sent just before the exit
+                try:
+                    result = queue.get(timeout=POLL)
+                except Empty:
+                    result = failed_run(shape, seed, "compiler process died, exit code %s" % child.exitcode)
+            elif time.time() > deadline:
+                child.terminate()
+                result = failed_run(shape, seed, "killed after %d seconds" % timeout)
+    child.join()
+    return result
+
+
+def growth(sizes, times):
+    '''Least-squares slope of log(time) over log(size)'''
+    points = [(math.log(s), math.log(t)) for s, t in zip(sizes, times) if s > 0 and t > 0]
+    if len(points) < 2 or max(sizes) < MIN_SPAN * min(sizes):
+        return None
+    mx = sum(x for x, y in points) / len(points)
+    my = sum(y for x, y in points) / len(points)
+    den = sum((x - mx) ** 2 for x, y in points)
+    if den == 0:
+        return None
+    return sum((x - mx) * (y - my) for x, y in points) / den
+
+
+def run_dimension(dimension, steps, seed=0, census=False, timeout=TIMEOUT):
+    first, fixed = SUITE[dimension]
+    runs = []
+    for step in range(steps):
+        shape = dict(fixed)
+        shape[dimension] = first * 2 ** step
+        if isinstance(first, float):
+            shape[dimension] = min(shape[dimension], 0.8)
+        runs.append(measure(shape, seed, census, timeout))
+    return runs
+
+
+def print_dimension(dimension, runs):
+    phases = []
+    for run in runs:
+        for phase in run['phases']:
+            if phase['name'] not in phases:
+                phases.append(phase['name'])
+
+    print("\n%s" % dimension)
+    print("%10s %8s %8s %5s %9s %9s  %s" % ('value', 'lines', 'bytes', 'ok', 'seconds', 'peak KB', 'slowest phase'))
+    for run in runs:
+        if not run['phases']:
+            print("%10s %8s %8s %5s" % (run['shape'][dimension], '-', '-', 'NO'))
+            continue
+        slowest = max(run['phases'], key=lambda p: p['wall_seconds'])
+        print("%10s %8d %8d %5s %9.3f %9d  %s %.3fs" % (run['shape'][dimension], run['source_lines'],
+                                                       run['source_bytes'], 'yes' if run['ok'] else 'NO',
+                                                       run['wall_seconds'],
+                                                       run['phases'][-1]['memory']['process_peak_rss_kb'],
+                                                       slowest['name'], slowest['wall_seconds']))
+    for run in runs:
+        if not run['ok']:
+            print("  %s=%s failed: %s" % (dimension, run['shape'][dimension], run['error']))
+
+    # the growth is measured on the runs that went through the whole pipeline
+    complete = [run for run in runs if run['ok']]
+    sizes = [run['source_bytes'] for run in complete]
+    exponents = dict()
+    for name in phases:
+        times = [sum(p['wall_seconds'] for p in run['phases'] if p['name'] == name) for run in complete]
+        exponents[name] = growth(sizes, times)
+    print("growth exponents: " + (", ".join(
+        "%s %.2f%s" % (name, e, ' (superlinear)' if e > SUPERLINEAR else '')
+        for name, e in sorted(exponents.items(), key=lambda kv: -(kv[1] or 0)) if e is not None) or "-"))
+    return exponents
+
+
+def main(argv):
+    import argparse
+    import json
+
+    argparser = argparse.ArgumentParser(description="Scaling benchmark of the compiler")
+    argparser.add_argument("--dimension", action="append", choices=sorted(SUITE),
+                           help="shape parameter to grow (all of them by default)")
+    argparser.add_argument("--steps", type=int, default=5, help="doublings of each parameter")
+    argparser.add_argument("--seed", type=int, default=0)
+    argparser.add_argument("--census", action="store_true", help="count the live objects at every phase")
+    argparser.add_argument("--timeout", type=int, default=TIMEOUT, metavar="SECONDS",
+                           help="longest compilation, the process is killed beyond it")
+    argparser.add_argument("--json", metavar="FILE", help="write all the measures to FILE")
+    args = argparser.parse_args(argv)
+
+    results = dict()
+    for dimension in args.dimension or sorted(SUITE):
+        runs = run_dimension(dimension, args.steps, args.seed, args.census, args.timeout)
+        results[dimension] = dict(runs=runs, growth=print_dimension(dimension, runs))
+
+    if args.json:
+        with open(args.json, "w") as fout:
+            json.dump(results, fout, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
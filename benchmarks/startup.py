@@ -0,0 +1,52 @@
+#!/usr/bin/python
+
+__doc__ = '''Start-up benchmark
+Times fresh interpreters importing the compiler, with and without loading the
+visualisation packages, and a headless compilation on a host without them.
+Usage: python2 benchmarks/startup.py [-n RUNS]'''
+
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# hide the visualisation packages, as on a host where they are not installed
+WITHOUT_PACKAGES = "import sys; sys.modules['graphviz'] = sys.modules['texttable'] = None; "
+
+CASES = (
+    ('interpreter', "pass"),
+    ('import compiler', "import pipeline"),
+    ('import compiler and visualisation',
+     "import pipeline, visualisation; visualisation.load('Digraph'); visualisation.load('Texttable')"),
+    ('compile test1.pl0 without the packages',
+     WITHOUT_PACKAGES + "import pipeline; pipeline.compile_file('test1.pl0')"),
+)
+
+
+def run(code, runs):
+    '''Return the wall times of runs fresh interpreters executing code'''
+    times = []
+    for i in range(runs):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-B', '-c', code], cwd=ROOT)
+        times.append(time.time() - start)
+    return times
+
+
+def main(argv):
+    import argparse
+
+    argparser = argparse.ArgumentParser(description="Start-up benchmark")
+    argparser.add_argument("-n", "--runs", type=int, default=10, help="interpreters per case")
+    args = argparser.parse_args(argv)
+
+    for name, code in CASES:
+        times = sorted(run(code, args.runs))
+        print("%-40s median %7.1f ms   min %7.1f ms" % (name, times[len(times) // 2] * 1000, times[0] * 1000))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
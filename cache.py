@@ -0,0 +1,148 @@
+#!/usr/bin/python
+
+__doc__ = '''Content-addressed compilation cache
+Entries are keyed by a hash of the source text, the compiler version and the enabled passes.
+Every entry holds the assembly and, optionally, the pickled intermediate artifacts.
+The cache is bounded in size, the least recently used entries are evicted first.'''
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+from logger import tracer
+
+ASSEMBLY_SUFFIX = '.s'
+ARTIFACTS_SUFFIX = '.pkl'
+
+
+class CompilationCache(object):
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:  # created concurrently
+                pass
+
+    def key(self, source, version, passes):
+        '''Key of a source text compiled by the given compiler version and passes'''
+        h = self.hasher(version, passes)
+        h.update(source)
+        return h.hexdigest()
+
+    def key_for_file(self, filename, version, passes, chunk=1 << 20):
+        '''Same as key, hashing the file by chunks'''
+        h = self.hasher(version, passes)
+        with open(filename, 'rb') as fin:
+            for block in iter(lambda: fin.read(chunk), ''):
+                h.update(block)
+        return h.hexdigest()
+
+    @staticmethod
+    def hasher(version, passes):
+        h = hashlib.sha1()
+        h.update(version + '\0' + ','.join(sorted(passes)) + '\0')
+        return h
+
+    def path(self, key, suffix):
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def get(self, key):
+        '''Return the cached assembly, or None'''
+        path = self.path(key, ASSEMBLY_SUFFIX)
+        try:
+            with open(path, 'rb') as fin:
+                assembly = fin.read()
+            # the modification time is the last use, for the LRU eviction
+            os.utime(path, None)
+        except (IOError, OSError):
+            if tracer.driver:
+                tracer.event('driver', 'cache_miss', key=key)
+            return None
+        if tracer.driver:
+            tracer.event('driver', 'cache_hit', key=key)
+        return assembly
+
+    def get_artifacts(self, key):
+        '''Return the cached intermediate artifacts (a dictionary), or None'''
+        try:
+            with open(self.path(key, ARTIFACTS_SUFFIX), 'rb') as fin:
+                return pickle.load(fin)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def put(self, key, assembly, artifacts=None, evict=True):
+        '''Store an entry, then evict the oldest ones if the cache is too big
+        (callers storing many entries at once pass evict=False and call evict() at the end)'''
+        if artifacts is not None:
+            try:
+                data = pickle.dumps(artifacts, pickle.HIGHEST_PROTOCOL)
+            except (pickle.PicklingError, TypeError, RuntimeError), e:
+                # the artifacts are optional, the assembly is still cached
+                if tracer.driver:
+                    tracer.event('driver', 'cache_artifacts_skipped', key=key, error=e)
+            else:
+                self.__write(self.path(key, ARTIFACTS_SUFFIX), data)
+        self.__write(self.path(key, ASSEMBLY_SUFFIX), assembly)
+        if evict:
+            self.evict()
+
+    def __write(self, path, data):
+        # write and rename, readers never see a partial entry
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                pass
+        fd, tmp = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'wb') as fout:
+            fout.write(data)
+        os.rename(tmp, path)
+
+    def entries(self):
+        '''Return the (last use, size, key) triples of the entries in the cache'''
+        entries = dict()
+        for sub in os.listdir(self.directory):
+            subdir = os.path.join(self.directory, sub)
+            if not os.path.isdir(subdir):
+                continue
+            for name in os.listdir(subdir):
+                key, suffix = os.path.splitext(name)
+                if suffix not in (ASSEMBLY_SUFFIX, ARTIFACTS_SUFFIX):
+                    continue
+                try:
+                    st = os.stat(os.path.join(subdir, name))
+                except OSError:  # evicted concurrently
+                    continue
+                used, size = entries.get(key, (0, 0))
+                if suffix == ASSEMBLY_SUFFIX:
+                    used = st.st_mtime
+                entries[key] = (used, size + st.st_size)
+        return [(used, size, key) for key, (used, size) in entries.items()]
+
+    def evict(self):
+        '''Remove the least recently used entries until the cache fits in max_bytes'''
+        entries = sorted(self.entries())
+        total = sum(size for used, size, key in entries)
+        for used, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            for suffix in (ASSEMBLY_SUFFIX, ARTIFACTS_SUFFIX):
+                try:
+                    os.remove(self.path(key, suffix))
+                except OSError:
+                    pass
+            total -= size
+            if tracer.driver:
+                tracer.event('driver', 'cache_evict', key=key, size=size)
+
+    def clear(self):
+        for used, size, key in self.entries():
+            for suffix in (ASSEMBLY_SUFFIX, ARTIFACTS_SUFFIX):
+                try:
+                    os.remove(self.path(key, suffix))
+                except OSError:
+                    pass
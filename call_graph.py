@@ -1,5 +1,6 @@
 from ir import *
-from graphviz import Digraph
+from visualisation import Digraph
+from logger import tracer
 
 class CallNode:
     def __init__(self, symbol=None, uses=None, calls=None, graph=None):
@@ -46,7 +47,7 @@ class CallNode:
 
 
 class CallGraph:
-    def __init__(self, cfg, symtab, show_before=True):
+    def __init__(self, cfg, symtab, show_before=False):
         self.symtab = symtab
         self.cfg = cfg
 
@@ -96,15 +97,19 @@ class CallGraph:
     def __fixed_point(self):
 
     	is_updated = True
+    	# rounds of the fixed point
+    	self.iterations = 0
 
     	while is_updated:
 
     		is_updated = False
+    		self.iterations += 1
 
     		for function, node in self.nodes.items():
     			is_updated = is_updated or (node.fixed_point_iteration())
 
         self.__remove_refexivity()
 
-    	print("Finished fixed point")
+    	if tracer.callgraph:
+    		tracer.event('callgraph', 'fixed_point', iterations=self.iterations)
 # 
\ No newline at end of file
@@ -4,8 +4,10 @@ __doc__ = '''Control Flow Graph implementation
 Includes cfg construction and liveness analysis.'''
 
 from support import get_node_list, get_symbol_tables
+from logger import tracer, DEBUG
 from ir import *
-from graphviz import Digraph
+from visualisation import Digraph
+from traversal import preorder, postorder, depth_first, ENTER, LEAVE
 
 class LivenessNode:
 
@@ -18,7 +20,6 @@ class LivenessNode:
 
         self.defs = statement.get_defs()
         self.uses = statement.get_uses()
-        self.visited = False
 
         self.live_in = set()
         self.live_out = set()
@@ -27,9 +28,6 @@ class LivenessNode:
     def add_follower(self, node):
         self.children.append(node)
 
-    def unvisit(self):
-        self.visited = False
-
     def dot_format(self):
         return self.statement.instr_dot_repr()
 
@@ -140,14 +138,19 @@ class LivenessNode:
 
 class LivenessGraph:
 
-    def __init__(self,root_BB, fsym):
+    def __init__(self,order, fsym):
+        """ order is the BlockOrder of the function """
 
         self.fsym = fsym
 
         self.node_list = []
+        # the nodes in the order of the fixed point
+        self.sweep = []
+        # rounds of the liveness fixed point
+        self.iterations = 0
 
         # create the graph
-        self.create(root_BB)
+        self.create(order)
 
         self.__liveness_fixed_point()
 
@@ -169,27 +172,32 @@ class LivenessGraph:
             node.add_stores()
 
 
-    def create(self, BB):
+    def create(self, order):
 
-        BB.visited = True
+        # BB -> its first and its last liveness node
+        chains = dict()
+        # BB -> the range of its nodes in node_list
+        spans = dict()
 
-        root = LivenessNode(BB.instrs[0], BB)
-        self.node_list.append(root)
-        current_node = root
-        prev = None
-        for i in range(1, len(BB.instrs)):
-            prev = current_node
-            current_node = LivenessNode(BB.instrs[i], BB)
-            self.node_list.append(current_node)
-            prev.add_follower(current_node)
+        for BB in order.blocks:
+            start = len(self.node_list)
+            chains[BB] = self._create_chain(BB)
+            spans[BB] = (start, len(self.node_list))
 
-        # the last one must be added to the begining of the other BB
-        for child in BB.children.values():
-            if child is None:
-                continue
-            current_node.add_follower(self._create_recursion(child))
+        for BB in order.blocks:
+            for succ in order.successors[BB]:
+                if tracer.liveness >= DEBUG:
+                    tracer.event('liveness', 'edge', source=BB.lbl_begin, target=succ.lbl_begin)
+                # the last one must be added to the begining of the other BB
+                chains[BB][1].add_follower(chains[succ][0])
+
+        # liveness flows backwards: the successors of a node
+        # are updated before it, except along the back edges
+        for BB in order.postorder:
+            start, end = spans[BB]
+            self.sweep.extend(reversed(self.node_list[start:end]))
 
-        self.root = root
+        self.root = chains[order.entry][0]
 
 
     def __liveness_fixed_point(self):
@@ -198,19 +206,16 @@ class LivenessGraph:
         while changed:
             
             changed = False
+            self.iterations += 1
 
-            for node in self.node_list:
+            for node in self.sweep:
                 changed |= node.live_fixed_point()
 
-        print("Finished liveness")
+        if tracer.liveness:
+            tracer.event('liveness', 'fixed_point', function=self.fsym.name, iterations=self.iterations)
 
-    def _create_recursion(self, BB):
-
-        if BB.visited:
-            return self.find_node(BB.instrs[0])
-        else:
-            # mark the BB as visited
-            BB.visited = True
+    def _create_chain(self, BB):
+        '''Liveness nodes of the instructions of BB, each one followed by the next'''
 
         root = LivenessNode(BB.instrs[0], BB)
         self.node_list.append(root)
@@ -222,16 +227,7 @@ class LivenessGraph:
             self.node_list.append(current_node)
             prev.add_follower(current_node)
 
-        # the last one must be added to the begining of the other BB
-
-
-        for key, child in BB.children.items():
-            print("\tkey :" + str(key))
-            if child is None:
-                continue
-            current_node.add_follower(self._create_recursion(child))
-
-        return root
+        return root, current_node
 
     def find_node(self, instr):
         for node in self.node_list:
@@ -239,11 +235,6 @@ class LivenessGraph:
                 return node
         return None
 
-
-    def _unvisit(self):
-        for node in self.node_list:
-            node.unvisit()
-
     def graphviz(self):
 
         G = Digraph(str(id(self)))
@@ -274,43 +265,38 @@ class LivenessGraph:
 
 
 class BasicBlock(object):
-    def __init__(self, block,fsym, parents=None, next=None):
+    def __init__(self, block,fsym, next=None, start=0, pending=None):
         '''Structure:
 		Zero, one (next) or two (next, target_bb) successors
 		Keeps information on labels
+		The predecessors are kept by the CFG (see BlockOrder)
+		The statements of block from index start on are expanded at once, or
+		queued on pending when the block is created by the expansion of another
 		'''
         self.fsym = fsym
         self.children = dict()
-        self.visited = False
         #if next is not None:
         self.children["next"] = next
 
-        if parents is None:
-            self.parents = []
-        else:
-            self.parents = list([parents])
-
         # list of instructions in the BB
         self.instrs = []
-        self.__expand_block(block)
 
-        self.lbl_begin = self.fsym.name + "_" + str(id(self))
-        self.lbl_end = self.fsym.name + "_" + str(id(self)) + "_end"
+        # set by the CFG once all the blocks of the function exist
+        self.lbl_begin = None
+        self.lbl_end = None
 
+        if pending is None:
+            self.__expand(block, start)
+        else:
+            pending.append((self, block, start))
 
-    def get_all_blocks(self):
-        """Get the list of all the BB reachable from the node"""
-        if self.visited is True:
-            return []
+    def set_label(self, label):
+        self.lbl_begin = label
+        self.lbl_end = label + ".end"
 
-        res = [self]
-        self.visited = True
 
-        for c in self.children.values():
-            if c is None:
-                continue
-            res.extend(c.get_all_blocks())
-        return res
+    def successors(self):
+        return [c for c in self.children.values() if c is not None]
 
     def _get_function_calls(self):
 
@@ -347,17 +333,6 @@ class BasicBlock(object):
         return dep
 
 
-    def add_parent(self, parent):
-        self.parents.append(parent)
-
-
-    def _graphviz_unvisit(self):
-        self.visited = False
-        
-        for c in self.children.values():
-            if c is not None and c.visited:
-                c._graphviz_unvisit()
-
     def to_three_addr_form(self):
         # new instructions in the list
         new_instr_list = []
@@ -375,7 +350,19 @@ class BasicBlock(object):
         self.instrs = new_instr_list
 
 
-    def __expand_block(self, instr_list):
+    def __expand(self, block, start):
+        """ Expand this BB and the ones created on the way, each one
+            before the BBs created after it and after the BBs it creates:
+            the order of a recursive construction, which numbers the
+            temporaries the same way """
+        stack = [(self, block, start)]
+        while stack:
+            BB, block, start = stack.pop()
+            created = []
+            BB.__expand_block(block, start, created)
+            stack.extend(reversed(created))
+
+    def __expand_block(self, instr_list, start, pending):
 
         # if block is of class Block
         if isinstance(instr_list, Block):
@@ -390,12 +377,16 @@ class BasicBlock(object):
             if isinstance(instr_list, Expr):
                 statlist = [instr_list]
             else:
-                print(">>>>>>>>>> Unexpected instr_list | Type : " + str(type(instr_list)))
+                if tracer.cfg:
+                    tracer.event('cfg', 'unexpected_instr_list', type=type(instr_list))
                 statlist = []
 
-        # Now statlist is a list of instructions
+        # Now statlist is a list of instructions, the BB starts at index start;
+        # the BBs after a branch, a loop or a call continue the same list
+        # from the next index, an empty remainder becomes a Nop
 
-        for index, inst in enumerate(statlist):
+        for index in xrange(start, len(statlist)):
+            inst = statlist[index]
             if isinstance(inst, IfStat):
 
                 symtab = inst.symtab
@@ -407,24 +398,16 @@ class BasicBlock(object):
                 self.instrs.append(branch)
 
                 # the remaining instructions
-                if len(statlist[index + 1:]) == 0:
-                    bb = BasicBlock([NopStat()],self.fsym, parents=None, next=self.children["next"])
-                else:
-                    bb = BasicBlock(statlist[index + 1:],self.fsym, parents = None, next=self.children["next"])
+                bb = BasicBlock(statlist, self.fsym, next=self.children["next"],
+                                start=index + 1, pending=pending)
 
-                #bb = BasicBlock(statlist[index + 1:],self.fsym, parents = None, next=self.children["next"])
-                
-                self.children["then"] = BasicBlock(inst.thenpart,self.fsym, parents=self, next=bb)
+                self.children["then"] = BasicBlock(inst.thenpart,self.fsym, next=bb, pending=pending)
                 branch.set_on_true(self.children["then"])
-                self.children["else"] = BasicBlock(inst.elsepart,self.fsym, parents=self, next=bb)
+                self.children["else"] = BasicBlock(inst.elsepart,self.fsym, next=bb, pending=pending)
                 branch.set_on_false(self.children["else"])
-                bb.add_parent(self.children["then"])
-                bb.add_parent(self.children["else"])
 
                 # remove the "next" entry
                 self.children["next"] = None
-                #self.children["then"].children["next"] = bb
-                #self.children["else"].children["next"] = bb
                 break
             elif isinstance(inst, WhileStat):
 
@@ -436,19 +419,17 @@ class BasicBlock(object):
                 branch = BranchStat(new_temp.symbol, symtab=symtab) 
 
 
-                cond =  BasicBlock([cond_eval, branch],self.fsym,  parents=self)
+                cond =  BasicBlock([cond_eval, branch],self.fsym, pending=pending)
                 
                 # the remaining instructions
-                if len(statlist[index + 1:]) == 0:
-                    rest = BasicBlock([NopStat()],self.fsym, parents=cond, next=self.children["next"])
-                else:
-                    rest = BasicBlock(statlist[index + 1:],self.fsym, parents=cond, next=self.children["next"])
+                rest = BasicBlock(statlist, self.fsym, next=self.children["next"],
+                                  start=index + 1, pending=pending)
                 
                 self.children["next"] = cond
 
                 # the body
                 
-                body = BasicBlock(inst.body,self.fsym, parents=cond, next=cond)
+                body = BasicBlock(inst.body,self.fsym, next=cond, pending=pending)
 
                 cond.children["true"] = body
                 branch.set_on_true(cond.children["true"])
@@ -457,19 +438,18 @@ class BasicBlock(object):
                 branch.set_on_false(cond.children["false"])
                 break
             elif isinstance(inst, CallStat):
-                rest = BasicBlock(statlist[index + 1:],self.fsym, parents=None ,next=self.children["next"])
+                rest = BasicBlock(statlist, self.fsym, next=self.children["next"],
+                                  start=index + 1, pending=pending)
                 if len(self.instrs) == 0:
                     # if no other instructions in the BB
                     # then do not create another BB 
                     self.instrs.append(inst.call)
                     self.children["next"] = rest
-                    rest.add_parent(self)
                 else:
                     # otherwise create a new one
-                    call =  BasicBlock(inst.call,self.fsym,  parents=self, next=self.children["next"])
+                    call =  BasicBlock(inst.call,self.fsym, next=self.children["next"], pending=pending)
                     self.children["next"] = call
                     call.children["next"] = rest
-                    rest.add_parent(call)
                 break
             elif isinstance(inst, ForStat):
                 pass
@@ -478,53 +458,40 @@ class BasicBlock(object):
 
         # if the BB is empty
         if len(self.instrs) == 0:
-            self.instrs.append(NopStat)
+            self.instrs.append(NopStat())
 
 
-    def generate_code(self, fsym):
-        self.visited = True
+    def generate_code(self, fsym, successors):
+        """ Code of the BBs reachable from this one, each one followed
+            by the code of its successors not placed yet
+            successors maps every BB to the list of its successors """
 
-        bb_code = ""
+        bb_code = []
 
-        bb_code += self.lbl_begin +  " :\n"
-
-
-        for inst in self.instrs:
-            bb_code += inst.generate_code(fsym)
-
-        if len(self.children.keys()) >= 1:
-            for child in self.children.values():
-                if child is not None:
-                    if child.visited:
-                        bb_code += "\t" + "j\t" + self.children.values()[0].lbl_begin + "\n" 
-                    else:
-                        bb_code += child.generate_code(fsym)
-        
-        if len(self.children.keys()) == 1 and self.children.values()[0] is None: 
-            # add return
-            bb_code += "\tjr\t$ra\n"
-
-        if len(self.children.keys()) == 0:
-            # add return
-            bb_code += "\tjr\t$ra\n"
+        for event, BB, parent in depth_first(self, successors.__getitem__):
+            if event == ENTER:
+                bb_code.append(BB.lbl_begin +  " :\n")
+                for inst in BB.instrs:
+                    bb_code.append(inst.generate_code(fsym))
+            elif event == LEAVE:
+                if len(successors[BB]) == 0:
+                    # add return
+                    bb_code.append("\tjr\t$ra\n")
+            else:
+                # the successor is already placed
+                bb_code.append("\t" + "j\t" + parent.children.values()[0].lbl_begin + "\n")
 
-        return bb_code
+        return "".join(bb_code)
 
 
     def graphviz(self, G):
-        
-        has_successor = False
 
-        if self.visited is True:
-            return
-
-        G.node(str(id(self)), self.__instr_dot_format(), {"shape":"record"}) 
-        self.visited = True
+        G.node(str(id(self)), self.__instr_dot_format(), {"shape":"record"})
 
+        has_successor = False
         for label, node in self.children.iteritems():
             if node is None:
                 continue
-            node.graphviz(G)
             G.edge(str(id(self)), str(id(node)), label=label)
             has_successor = True
         # if no successor go to end
@@ -542,6 +509,61 @@ class BasicBlock(object):
         res = res[:-1] + "}"
         return res
 
+class BlockOrder(object):
+    '''Orderings of the BBs of one function, computed once on first use
+    and kept until the CFG of the function changes (see CFG.invalidate)'''
+
+    def __init__(self, entry):
+        self.entry = entry
+        self.invalidate()
+
+    def invalidate(self):
+        self._successors = None
+        self._predecessors = None
+        self._blocks = None
+        self._postorder = None
+        self._reverse_postorder = None
+
+    @property
+    def successors(self):
+        """ BB -> list of its successors, in the order of its children """
+        if self._successors is None:
+            self._successors = dict()
+            for BB in preorder(self.entry, BasicBlock.successors):
+                self._successors[BB] = BB.successors()
+        return self._successors
+
+    @property
+    def predecessors(self):
+        """ BB -> list of its predecessors, in the order of the blocks """
+        if self._predecessors is None:
+            successors = self.successors
+            self._predecessors = dict((BB, []) for BB in successors)
+            for BB in self.blocks:
+                for succ in successors[BB]:
+                    self._predecessors[succ].append(BB)
+        return self._predecessors
+
+    @property
+    def blocks(self):
+        """ The BBs in depth-first pre-order, the entry one first """
+        if self._blocks is None:
+            self._blocks = list(preorder(self.entry, self.successors.__getitem__))
+        return self._blocks
+
+    @property
+    def postorder(self):
+        if self._postorder is None:
+            self._postorder = list(postorder(self.entry, self.successors.__getitem__))
+        return self._postorder
+
+    @property
+    def reverse_postorder(self):
+        if self._reverse_postorder is None:
+            self._reverse_postorder = self.postorder[::-1]
+        return self._reverse_postorder
+
+
 class CFG(list):
     '''Control Flow Graph representation'''
 
@@ -553,9 +575,12 @@ class CFG(list):
         # dictionary of list of 
         # all the BB in the CFG
         self.BB_list = dict()
+        # orderings and predecessors of the BBs
+        # of every function
+        self.orders = dict()
 
         # build CFG recursively
-        self.__build_CFG(root.local_symtab.fsym, root)
+        self.__build_CFG(root)
 
         # which other functions a function calls
         self.function_calls = dict()
@@ -568,21 +593,35 @@ class CFG(list):
         # functions each function uses
         self.used_var = dict()
 
-    def __build_CFG(self, fsym, block):
-        self.__build_CFG_function(fsym, block)
-
-        # look for other functions to inspect
-        for c in block.defs.children:
-            self.__build_CFG(c.symbol, c.body)
+    def __build_CFG(self, root):
+        # the procedures nested in root, then the ones nested in them
+        for block in preorder(root, procedure_blocks, unique=False):
+            self.__build_CFG_function(block.local_symtab.fsym, block)
 
 
     def __build_CFG_function(self, fsym, block):
         
         # build the CFG of a function in the program
-        print(">>>>> CFG of " + fsym.name)
+        if tracer.cfg:
+            tracer.event('cfg', 'build', function=fsym.name)
         self.cfgs[fsym] = BasicBlock(block, fsym)
-        self.BB_list[fsym] = self.cfgs[fsym].get_all_blocks()
-        self.cfgs[fsym]._graphviz_unvisit()
+        self.orders[fsym] = BlockOrder(self.cfgs[fsym])
+        self.__number_blocks(fsym)
+
+    def __number_blocks(self, fsym):
+        self.BB_list[fsym] = self.orders[fsym].blocks
+
+        # labels depend only on the function, so that its code
+        # is the same in every program that contains it
+        label = procedure_label(fsym)
+        for idx, BB in enumerate(self.BB_list[fsym]):
+            BB.set_label(label + "." + str(idx))
+
+    def invalidate(self, fsym):
+        """ Forget the orderings of the BBs of fsym, to be called
+            after changing the successors of its BBs """
+        self.orders[fsym].invalidate()
+        self.__number_blocks(fsym)
 
 
 
@@ -597,10 +636,9 @@ class CFG(list):
             for BB in self.BB_list[fsym]:
                 fun_calls[fsym].update(BB._get_function_calls())
 
-        for f, v in self.function_calls.items():
-            print(f.name  + " calls ")
-            for j in v:
-                print("\t" + j.name)
+        if tracer.cfg:
+            for f, v in self.function_calls.items():
+                tracer.event('cfg', 'calls', function=f.name, called=[j.name for j in v])
 
 
         return fun_calls
@@ -614,15 +652,21 @@ class CFG(list):
             G.node(str(0),"End "  + fsym.name, {"shape":"house","style":"filled","color":"red"})
             G.edge(str(id(fsym)), str(id(cfg)))
 
-            cfg._graphviz_unvisit()
-            cfg.graphviz(G)
+            for BB in self.orders[fsym].blocks:
+                BB.graphviz(G)
             G.view()
 
-    def three_addr_form(self):
-        """ Put the CFG int three_addr_form form """
+    def three_addr_form(self, functions=None):
+        """ Put the CFG int three_addr_form form
+            (only the CFGs of the given functions, if any) """
         for fsym, cfg in self.cfgs.iteritems():
-            print("three_addr_form in " + fsym.name)
-            cfg.to_three_addr_form()
+            if functions is not None and fsym not in functions:
+                continue
+            if tracer.cfg:
+                tracer.event('cfg', 'three_addr_form', function=fsym.name)
+            # every block, not only the entry one
+            for BB in self.BB_list[fsym]:
+                BB.to_three_addr_form()
  
 
     def get_function_dependency(self):
@@ -641,32 +685,35 @@ class CFG(list):
             used_var[fsym].update(self.BB_list[fsym][0]._get_used_vars())
 
 
-        for f, v in fun_dep.items():
-            print(f.name  + " uses ")
-            for j in v:
-                print("\t" + str(j))
+        if tracer.cfg:
+            for f, v in fun_dep.items():
+                tracer.event('cfg', 'uses', function=f.name, used=[str(j) for j in v])
 
         return fun_dep
 
-    def liveness_graphs(self, show=False):
+    def liveness_graphs(self, show=False, functions=None):
 
         self.liveness_graphs = dict()
 
         for fsym in self.cfgs.keys():
-            print(">>> Computing liveness graph of " + fsym.name) 
-            self.cfgs[fsym]._graphviz_unvisit()
-            self.liveness_graphs[fsym] = LivenessGraph(self.cfgs[fsym], fsym)
+            if functions is not None and fsym not in functions:
+                continue
+            if tracer.liveness:
+                tracer.event('liveness', 'build', function=fsym.name)
+            self.liveness_graphs[fsym] = LivenessGraph(self.orders[fsym], fsym)
 
 
         if show:
-            for fsym in self.cfgs.keys(): 
+            for fsym in self.liveness_graphs.keys():
                 self.liveness_graphs[fsym].graphviz()
         
         return self.liveness_graphs
 
-    def code_generation(self, filename):
-
-        file = open(filename,"w")
+    def code_generation(self, filename=None, reuse=None):
+        """ Generate the assembly of the program, return it
+            and write it to filename if given
+            reuse maps functions to their already generated code,
+            the code of every function is kept in function_code """
 
         called_fn = self.entry_function
 
@@ -683,25 +730,37 @@ class CFG(list):
         prelude += "\t" + "move $fp, $sp" + "\n"
         prelude += "\taddi $sp,$sp, -" + str(4*len(called_fn.stack)) + "\n"
 
-        prelude += "\tj " + self.entry_function.name + "_" + str(id(self.entry_function)) \
+        prelude += "\tj " + procedure_label(self.entry_function) \
                         + "\n\t# exiting the program\n\tli\t$v0, 10\n\tsyscall\n\n\n"
 
 
         body = ""
+        self.function_code = dict()
 
-        for fsym in self.cfgs.keys():
-            self.cfgs[fsym]._graphviz_unvisit()
-            print(">>> Generatin code of " + fsym.name)
+        for fsym in sorted(self.cfgs.keys(), key=procedure_label):
+            if reuse is not None and fsym in reuse:
+                self.function_code[fsym] = reuse[fsym]
+                body += reuse[fsym]
+                continue
+
+            if tracer.codegen:
+                tracer.event('codegen', 'function', function=fsym.name)
 
             # add the label for the function
-            body += "\n#####################################\n######    " + fsym.name + \
-                "\n#####################################\n" + fsym.name + "_" + str(id(fsym))  + " : \n" \
+            code = "\n#####################################\n######    " + fsym.name + \
+                "\n#####################################\n" + procedure_label(fsym)  + " : \n" \
                     + "#************************************\n\n"
 
-            body += self.cfgs[fsym].generate_code(fsym)
             # create code from cfg
+            code += self.cfgs[fsym].generate_code(fsym, self.orders[fsym].successors)
+
+            self.function_code[fsym] = code
+            body += code
+
 
 
+        if filename is not None:
+            with open(filename, "w") as file:
+                file.write(prelude + body)
 
-        file.write(prelude + body)
-        file.close()
\ No newline at end of file
+        return prelude + body
\ No newline at end of file
@@ -0,0 +1,213 @@
+#!/usr/bin/python
+
+__doc__ = '''Compile server
+A long-running process that listens on a Unix socket, so that clients pay the
+start-up of the interpreter and the imports of the compiler once.
+Compilations run on a bounded pool of worker processes: the compiler keeps
+module level state and cannot run in threads. A compilation is stopped after
+a timeout, by an alarm in its worker and, should the worker not answer, by
+the connection giving up on it; workers are recycled after a number of
+compilations, as in batch.py.
+
+Protocol: the client sends one JSON line
+    {"source": "...", "options": {"passes": [...], "incremental": true}}
+and receives JSON lines, "diagnostic" events, then "assembly" events holding
+chunks of the output, then a final "done" event with the outcome.
+Usage: python2 daemon.py serve [-s SOCKET] [-j JOBS] [--cache DIR] [--timeout SECONDS]
+       python2 daemon.py compile [-s SOCKET] [-o OUTPUT] source'''
+
+import json
+import math
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+import SocketServer
+from multiprocessing import Pool, TimeoutError, cpu_count
+
+from logger import tracer
+
+DEFAULT_SOCKET = '/tmp/pl0c.sock'
+# size of the assembly chunks streamed back
+CHUNK = 64 * 1024
+# the options a client may set, the others are reserved to the server
+CLIENT_OPTIONS = ('passes', 'incremental')
+# seconds a compilation may take
+TIMEOUT = 60
+# seconds the connection waits for a worker beyond the timeout
+GRACE = 5
+
+# per worker process, see init_worker
+worker_cache = None
+worker_timeout = None
+
+
+class CompileTimeout(Exception):
+    pass
+
+
+def on_alarm(signum, frame):
+    raise CompileTimeout()
+
+
+def init_worker(cache_directory, timeout=TIMEOUT):
+    '''Import the compiler once per worker'''
+    global worker_cache, worker_timeout
+    # Ctrl-C stops the server, which then shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGALRM, on_alarm)
+    worker_timeout = timeout
+    import pipeline
+    if cache_directory is not None:
+        from cache import CompilationCache
+        worker_cache = CompilationCache(cache_directory)
+
+
+def compile_request(request):
+    '''Worker: compile the source of a request, never raises'''
+    from pipeline import compile_text, CompilationError
+
+    options = dict((k, v) for k, v in request.get('options', {}).items() if k in CLIENT_OPTIONS)
+    if 'passes' in options:
+        options['passes'] = tuple(options['passes'])
+    source = request['source']
+    if isinstance(source, unicode):
+        source = source.encode('utf-8')
+    start = time.time()
+    if worker_timeout:
+        signal.alarm(int(math.ceil(worker_timeout)))
+    try:
+        assembly = compile_text(source, cache=worker_cache, **options)
+        return dict(ok=True, assembly=assembly, errors=[], seconds=time.time() - start)
+    except CompileTimeout:
+        return dict(ok=False, assembly=None, seconds=time.time() - start,
+                    errors=["compilation timed out after %g seconds" % worker_timeout])
+    except CompilationError, e:
+        return dict(ok=False, assembly=None, errors=e.errors, seconds=time.time() - start)
+    except Exception, e:
+        return dict(ok=False, assembly=None, seconds=time.time() - start,
+                    errors=[traceback.format_exception_only(type(e), e)[-1].strip()])
+    finally:
+        signal.alarm(0)
+
+
+class CompileHandler(SocketServer.StreamRequestHandler):
+    def send(self, event, **fields):
+        fields['event'] = event
+        self.wfile.write(json.dumps(fields) + '\n')
+
+    def handle(self):
+        line = self.rfile.readline()
+        try:
+            request = json.loads(line)
+            request['source']
+        except (ValueError, KeyError, TypeError):
+            self.send('done', ok=False, error='malformed request')
+            return
+
+        # block the connection, not the server, while the pool is saturated
+        start = time.time()
+        with self.server.slots:
+            pending = self.server.pool.apply_async(compile_request, (request,))
+            try:
+                result = pending.get(self.server.compile_timeout + GRACE)
+            except TimeoutError:
+                result = dict(ok=False, assembly=None, seconds=time.time() - start,
+                              errors=["no answer from the worker after %g seconds" % (time.time() - start)])
+
+        if tracer.driver:
+            tracer.event('driver', 'served', ok=result['ok'], seconds=result['seconds'])
+
+        for error in result['errors']:
+            self.send('diagnostic', message=error)
+        if result['assembly'] is not None:
+            assembly = result['assembly']
+            for i in range(0, len(assembly), CHUNK):
+                self.send('assembly', text=assembly[i:i + CHUNK])
+        self.send('done', ok=result['ok'], seconds=result['seconds'])
+
+
+class CompileServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, processes=None, cache_directory=None, backlog=4, timeout=TIMEOUT,
+                 maxtasksperchild=100):
+        if os.path.exists(path):
+            os.remove(path)
+        SocketServer.UnixStreamServer.__init__(self, path, CompileHandler)
+        processes = processes or cpu_count()
+        self.compile_timeout = timeout
+        self.pool = Pool(processes, init_worker, (cache_directory, timeout), maxtasksperchild=maxtasksperchild)
+        # requests waiting for a worker, beyond them the clients wait to be read
+        self.slots = threading.BoundedSemaphore(processes * backlog)
+
+    def server_close(self):
+        SocketServer.UnixStreamServer.server_close(self)
+        self.pool.close()
+        self.pool.join()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def request(source, path=DEFAULT_SOCKET, **options):
+    '''Client: send a compilation request, yield the events of the reply'''
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    try:
+        sock.sendall(json.dumps(dict(source=source, options=options)) + '\n')
+        for line in sock.makefile('rb'):
+            yield json.loads(line)
+    finally:
+        sock.close()
+
+
+def main(argv):
+    import argparse
+
+    argparser = argparse.ArgumentParser(description="PL/0 compile server")
+    commands = argparser.add_subparsers(dest="command")
+    serve = commands.add_parser("serve", help="run the server")
+    serve.add_argument("-s", "--socket", default=DEFAULT_SOCKET, help="path of the Unix socket")
+    serve.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (all CPUs by default)")
+    serve.add_argument("--cache", metavar="DIR", help="compilation cache shared by the workers")
+    serve.add_argument("--timeout", type=float, default=TIMEOUT, metavar="SECONDS",
+                       help="longest compilation (%(default)s seconds by default)")
+    serve.add_argument("--max-tasks", type=int, default=100, metavar="N",
+                       help="compilations before a worker is replaced")
+    client = commands.add_parser("compile", help="compile a file on a running server")
+    client.add_argument("source", help="PL/0 source file")
+    client.add_argument("-s", "--socket", default=DEFAULT_SOCKET, help="path of the Unix socket")
+    client.add_argument("-o", "--output", default="main.s", help="assembly output file")
+    client.add_argument("--incremental", action="store_true", help="recompile only the procedures that changed")
+    args = argparser.parse_args(argv)
+
+    if args.command == "serve":
+        server = CompileServer(args.socket, args.jobs, args.cache, timeout=args.timeout,
+                               maxtasksperchild=args.max_tasks)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return 0
+
+    with open(args.source) as fin:
+        source = fin.read()
+    ok = False
+    with open(args.output, "w") as fout:
+        for event in request(source, args.socket, incremental=args.incremental):
+            if event['event'] == 'diagnostic':
+                sys.stderr.write(event['message'] + '\n')
+            elif event['event'] == 'assembly':
+                fout.write(event['text'])
+            elif event['event'] == 'done':
+                ok = event['ok']
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
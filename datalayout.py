@@ -1,5 +1,6 @@
-from texttable import Texttable
-from ir import FunctionType
+from visualisation import Texttable
+from ir import FunctionType, procedure_label
+from logger import tracer
 
 def data_layout(symtab, call_graph):
 
@@ -35,7 +36,8 @@ def datalayout_f(function, f_symtab, call_graph):
 	used_functions = call_graph.function_uses[function]
 	stack = []
 
-	for uses in used_functions:
+	# in a fixed order, the layout must not change between compilations
+	for uses in sorted(used_functions, key=procedure_label):
 		stack.append(uses)
 
 	# then reserve space for local variables
@@ -48,7 +50,8 @@ def datalayout_f(function, f_symtab, call_graph):
 			stack.append(sym)
 
 	# print the result 
-	print("> Stack of " + function.name)
-	print_data_layout(stack)
+	if tracer.layout:
+		tracer.message('layout', "Stack of " + function.name)
+		print_data_layout(stack)
 
 	return stack
\ No newline at end of file
@@ -1,4 +1,4 @@
-from texttable import Texttable
+from visualisation import Texttable
 
 from ir import *
 from logger import logger
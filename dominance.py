@@ -0,0 +1,224 @@
+#!/usr/bin/python
+
+__doc__ = '''Dominators and natural loops of the CFG of every procedure
+The dominator tree is computed with the iterative algorithm of Cooper, Harvey
+and Kennedy ("A Simple, Fast Dominance Algorithm") on the reverse post-order of
+the BBs, kept by the CFG (cfg.BlockOrder); the dominance frontiers follow from
+it. A back edge goes from a BB to one of its dominators, the header of a
+natural loop; the loops with the same header are merged, the loops are nested
+by inclusion. The analysis is a snapshot: it must be done again after a change
+of the edges of the CFG.
+Usage: nests = loop_nests(cfg); nests[fsym].depth(BB)'''
+
+from logger import tracer, DEBUG
+
+
+class DominatorTree(object):
+    '''Immediate dominators of the BBs of one function'''
+
+    def __init__(self, order):
+        '''order -- the BlockOrder of the function'''
+        self.entry = order.entry
+        self.predecessors = order.predecessors
+        self.rpo = order.reverse_postorder
+        # BB -> its index in the reverse post-order
+        self.number = dict((BB, idx) for idx, BB in enumerate(self.rpo))
+        # rounds of the fixed point
+        self.iterations = 0
+
+        self.idom = dict()
+        self.__fixed_point()
+
+        # the entry has no immediate dominator
+        self.idom[self.entry] = None
+        self.children = dict((BB, []) for BB in self.rpo)
+        for BB in self.rpo[1:]:
+            self.children[self.idom[BB]].append(BB)
+
+        self._frontiers = None
+
+    def __intersect(self, a, b):
+        number = self.number
+        idom = self.idom
+        while a is not b:
+            while number[a] > number[b]:
+                a = idom[a]
+            while number[b] > number[a]:
+                b = idom[b]
+        return a
+
+    def __fixed_point(self):
+        idom = self.idom
+        # the entry is its own dominator while iterating
+        idom[self.entry] = self.entry
+
+        changed = True
+        while changed:
+            changed = False
+            self.iterations += 1
+            for BB in self.rpo[1:]:
+                new_idom = None
+                for pred in self.predecessors[BB]:
+                    # only the predecessors already processed
+                    if pred not in idom:
+                        continue
+                    if new_idom is None:
+                        new_idom = pred
+                    else:
+                        new_idom = self.__intersect(pred, new_idom)
+                if idom.get(BB) is not new_idom:
+                    idom[BB] = new_idom
+                    changed = True
+
+    def dominates(self, a, b):
+        '''Whether every path from the entry to b goes through a'''
+        number = self.number
+        while b is not None and number[b] > number[a]:
+            b = self.idom[b]
+        return b is a
+
+    def dominators(self, BB):
+        '''The dominators of BB, from BB up to the entry'''
+        res = []
+        while BB is not None:
+            res.append(BB)
+            BB = self.idom[BB]
+        return res
+
+    @property
+    def frontiers(self):
+        """ BB -> set of the BBs where its dominance ends """
+        if self._frontiers is None:
+            self._frontiers = dict((BB, set()) for BB in self.rpo)
+            for BB in self.rpo:
+                preds = self.predecessors[BB]
+                if len(preds) < 2:
+                    continue
+                for pred in preds:
+                    runner = pred
+                    while runner is not None and runner is not self.idom[BB]:
+                        self._frontiers[runner].add(BB)
+                        runner = self.idom[runner]
+        return self._frontiers
+
+
+class Loop(object):
+    '''Natural loop: the header, the BBs of the body (header included)
+    and the latches, the sources of the back edges to the header'''
+
+    def __init__(self, header):
+        self.header = header
+        self.blocks = set([header])
+        self.latches = []
+        # the innermost loop containing this one, and the ones it contains
+        self.parent = None
+        self.children = []
+        # 1 for an outermost loop
+        self.depth = 1
+        # the only BB outside of the loop entering it,
+        # if its only successor is the header
+        self.preheader = None
+
+    def __repr__(self):
+        return "Loop(" + str(self.header.lbl_begin) + ", " + str(len(self.blocks)) + " BBs, depth " \
+            + str(self.depth) + ")"
+
+
+class LoopNest(object):
+    '''Dominator tree, natural loops and loop nesting of one function'''
+
+    def __init__(self, order, fsym):
+        self.fsym = fsym
+        self.order = order
+        self.dominators = DominatorTree(order)
+
+        # header -> its loop
+        self.loops = dict()
+        self.__find_loops()
+
+        # outermost loops first, in the order of the blocks otherwise
+        self.loop_list = sorted([self.loops[BB] for BB in order.blocks if BB in self.loops],
+                                key=lambda loop: -len(loop.blocks))
+        # BB -> the innermost loop containing it
+        self.innermost = dict()
+        self.roots = []
+        self.__nest_loops()
+
+        for loop in self.loop_list:
+            loop.preheader = self.__preheader(loop)
+
+    def __find_loops(self):
+        dominators = self.dominators
+        successors = self.order.successors
+        predecessors = self.order.predecessors
+
+        for BB in self.order.blocks:
+            for succ in successors[BB]:
+                if not dominators.dominates(succ, BB):
+                    continue
+                # back edge: BB is a latch of the loop headed by succ
+                loop = self.loops.get(succ)
+                if loop is None:
+                    loop = self.loops[succ] = Loop(succ)
+                loop.latches.append(BB)
+
+                # the body: what reaches the latch without the header
+                stack = [BB]
+                while stack:
+                    node = stack.pop()
+                    if node in loop.blocks:
+                        continue
+                    loop.blocks.add(node)
+                    stack.extend(predecessors[node])
+
+    def __nest_loops(self):
+        # a loop contained in another one is strictly smaller and comes after
+        # it: the innermost loop containing a header when its loop is reached
+        # is its parent
+        for loop in self.loop_list:
+            loop.parent = self.innermost.get(loop.header)
+            if loop.parent is None:
+                self.roots.append(loop)
+            else:
+                loop.parent.children.append(loop)
+                loop.depth = loop.parent.depth + 1
+            for BB in loop.blocks:
+                self.innermost[BB] = loop
+
+    def __preheader(self, loop):
+        outside = [pred for pred in self.order.predecessors[loop.header] if pred not in loop.blocks]
+        if len(outside) != 1:
+            return None
+        pred = outside[0]
+        if self.order.successors[pred] != [loop.header]:
+            return None
+        return pred
+
+    def loop_of(self, BB):
+        '''The innermost loop containing BB, None outside of the loops'''
+        return self.innermost.get(BB)
+
+    def depth(self, BB):
+        '''Number of loops containing BB'''
+        loop = self.innermost.get(BB)
+        if loop is None:
+            return 0
+        return loop.depth
+
+
+def loop_nests(cfg):
+    '''LoopNest of every function of the CFG'''
+    res = dict()
+    for fsym in cfg.cfgs:
+        res[fsym] = LoopNest(cfg.orders[fsym], fsym)
+        if tracer.cfg:
+            nest = res[fsym]
+            tracer.event('cfg', 'loops', function=fsym.name, loops=len(nest.loop_list),
+                         depth=max([loop.depth for loop in nest.loop_list] or [0]),
+                         dominator_iterations=nest.dominators.iterations)
+        if tracer.cfg >= DEBUG:
+            for loop in res[fsym].loop_list:
+                tracer.event('cfg', 'loop', function=fsym.name, header=loop.header.lbl_begin,
+                             blocks=len(loop.blocks), depth=loop.depth,
+                             preheader=loop.preheader.lbl_begin if loop.preheader is not None else None)
+    return res
@@ -1,19 +1,11 @@
 #!/usr/bin/python
 
 from ir import *
-from logger import logger
+from logger import logger, tracer, DEBUG
 import sys
 from lexer import symbols as lex_symbols
-from lexer import lexer, __test_program
-from sys import argv
-from call_graph import CallGraph
-from register_alloc import *
-
-
-
-from support import *
-from datalayout import data_layout
-from cfg import *
+from lexer import positioned_lexer, stream_lexer, format_position, __test_program
+from tokenbuffer import TokenBuffer, token_names
 
 # this implement the recursive descent parser for PL/0
 __doc__ = '''PL/0 recursive descent parser adapted from Wikipedia'''
@@ -22,12 +14,6 @@ symbols = lex_symbols.keys()  # [ 'ident', 'number', 'lparen', 'rparen', 'times'
 # 'neq', 'lss', 'leq', 'gtr', 'geq', 'callsym', 'beginsym', 'semicolon', 'endsym', 'ifsym', 'whilesym', 'becomes',
 # 'thensym', 'dosym', 'constsym', 'comma', 'varsym', 'procsym', 'period', 'oddsym' ]
 
-sym = None
-value = None
-new_sym = None
-new_value = None
-
-
 
 
 class FunctionStack(list):
@@ -43,357 +29,641 @@ class FunctionStack(list):
 
     def pop(self):
         r = super(FunctionStack, self).pop(self.level - 1)
-        debug("exiting " + r.name + " , level is " + str(self.level))
+        if tracer.parser >= DEBUG:
+            tracer.event('parser', 'exit_function', name=r.name, level=self.level)
         self.level -= 1
         return r
 
     def push(self, o):
         self.append(o)
         self.level += 1
-        debug("entering " + o.name + " , now level is " + str(self.level))
-
-
-function_stack = FunctionStack()
-
-
-# this method updates the global variables
-def getsym():
-    """Update sym"""
-    global new_sym
-    global new_value
-    global sym
-    global value
-    try:
-        sym = new_sym
-        value = new_value
-        new_sym, new_value = the_lexer.next()
-    except StopIteration:  # this in case I don't have anymore tokens
-        return 2  # 2 to signal the end of the program
-    print 'getsym:', new_sym, new_value
-    return 1
-
-
-def error(msg):
-    FAIL = '\033[91m'
-    ENDC = '\033[0m'
-    print FAIL, msg, new_sym, new_value, ENDC
-
-
-# if the next symbol is the one we are looking for then we consume it
-# and return ut
-def accept(s):
-    print 'accepting', s, '==', new_sym
-    return getsym() if new_sym == s else 0
-
-
-# if we find the symbol we are expectiong we return 1 otherwhise 0
-def expect(s):
-    print 'expecting', s
-    if accept(s):
+        if tracer.parser >= DEBUG:
+            tracer.event('parser', 'enter_function', name=o.name, level=self.level)
+
+
+class Parser(object):
+    '''Recursive descent parser, it owns the whole parsing state
+    so that several programs can be parsed in the same process'''
+
+    grammar_rules = ('program', 'block', 'statement', 'condition', 'expression', 'term', 'factor')
+
+    def __init__(self, tokens):
+        # token buffer of the program and index of the token after new_sym
+        self.tokens = tokens
+        self.token_index = 0
+
+        self.sym = None
+        self.value = None
+        self.new_sym = None
+        self.new_value = None
+
+        self.function_stack = FunctionStack()
+        # error messages reported while parsing
+        self.errors = []
+
+        # the grammar rules are wrapped only when they have to be traced
+        if tracer.parser >= DEBUG:
+            for rule in self.grammar_rules:
+                setattr(self, rule, logger(getattr(self, rule)))
+
+    # this method updates the parser state
+    def getsym(self):
+        """Update sym"""
+        self.sym = self.new_sym
+        self.value = self.new_value
+        if self.token_index >= len(self.tokens):  # this in case I don't have anymore tokens
+            return 2  # 2 to signal the end of the program
+        self.new_sym = token_names[self.tokens.kinds[self.token_index]]
+        self.new_value = self.tokens.values[self.token_index]
+        self.token_index += 1
+        if tracer.parser >= DEBUG:
+            tracer.event('parser', 'getsym', sym=self.new_sym, value=self.new_value)
         return 1
-    error("expect: unexpected symbol")
-    return 0
-
 
-###################################
-# Grammar Rules
-#
-# for each rule  aseries of conditional
-# is put for each symbol to accept.
-
-
-# the symbol table is used also for some semantic checks
-@logger
-def factor(symtab):
-    # we return small parts of the AST, in this case Variables nodes
-    # and also constants
-    if accept('ident'):
-        return Var(var=symtab.find(value), symtab=symtab)
-    if accept('number'):
-        return Const(value=value, symtab=symtab)
-    elif accept('lparen'):
-        expr = expression(symtab)
-        expect('rparen')
-        return expr
-    else:
-        error("factor: syntax error")
-        getsym()
-
-
-@logger
-def term(symtab):
-    op = None
-    expr = factor(symtab)
-    while new_sym in ['times', 'slash', 'mod']:
-        getsym()
-        op = sym
-        # build and unbalanced tree ( we are keeping the order of the operations)
-        expr2 = factor(symtab)
-        expr = BinExpr(children=[op, expr, expr2], symtab=symtab)
-    return expr
-
-
-@logger
-def expression(symtab):
-    op = None
-
-    # takes in account for the first unary operator
-    if new_sym in ['plus', 'minus']:
-        getsym()
-        op = sym
-    expr = term(symtab)
-
-    # FIXED_ERROR: i changed 'initial_op' to just 'op' into the constructor of UnExp
-    if op:
-        expr = UnExpr(children=[op, expr], symtab=symtab)
-    while new_sym in ['plus', 'minus']:
-        getsym()
-        op = sym
-        expr2 = term(symtab)
-        expr = BinExpr(children=[op, expr, expr2], symtab=symtab)
-    return expr
-
-
-@logger
-def condition(symtab):
-    if accept('oddsym'):
-        return UnExpr(children=['odd', expression(symtab)], symtab=symtab)
-    else:
-        expr = expression(symtab)
-        if new_sym in ['eql', 'neq', 'lss', 'leq', 'gtr', 'geq']:
-            getsym()
-            print 'condition operator', sym, new_sym
-            op = sym
-            expr2 = expression(symtab)
-            return BinExpr(children=[op, expr, expr2], symtab=symtab)
+    def error(self, msg):
+        FAIL = '\033[91m'
+        ENDC = '\033[0m'
+        if 0 < self.token_index <= len(self.tokens):
+            msg = format_position(self.tokens.position(self.token_index - 1)) + ": " + msg
+        self.errors.append(msg)
+        print FAIL, msg, self.new_sym, self.new_value, ENDC
+
+    def lookahead(self, k=1):
+        """Token k positions after the current one (new_sym is k = 0)"""
+        idx = self.token_index - 1 + k
+        if 0 <= idx < len(self.tokens):
+            return token_names[self.tokens.kinds[idx]]
+        return None
+
+    # if the next symbol is the one we are looking for then we consume it
+    # and return ut
+    def accept(self, s):
+        if tracer.parser >= DEBUG:
+            tracer.event('parser', 'accept', expected=s, sym=self.new_sym)
+        return self.getsym() if self.new_sym == s else 0
+
+    # if we find the symbol we are expectiong we return 1 otherwhise 0
+    def expect(self, s):
+        if self.accept(s):
+            return 1
+        self.error("expect: unexpected symbol")
+        return 0
+
+    ###################################
+    # Grammar Rules
+    #
+    # for each rule  aseries of conditional
+    # is put for each symbol to accept.
+
+    # the symbol table is used also for some semantic checks
+    def factor(self, symtab):
+        # we return small parts of the AST, in this case Variables nodes
+        # and also constants
+        if self.accept('ident'):
+            return Var(var=symtab.find(self.value), symtab=symtab)
+        if self.accept('number'):
+            return Const(value=self.value, symtab=symtab)
+        elif self.accept('lparen'):
+            expr = self.expression(symtab)
+            self.expect('rparen')
+            return expr
         else:
-            error("condition: invalid operator")
-            getsym()
-
-
-@logger
-def statement(symtab):
-    if accept('ident'):
-        target = symtab.find(value)
-        if target is None:
-            debug("################### is None " + value)
-        expect('becomes')  # ':='
-        expr = expression(symtab)
-
-        return AssignStat(target=target, expr=expr, symtab=symtab)
-    elif accept('callsym'):
-        expect('ident')
-        # procedures works on global variables, there are no parameters or
-        # return values.
-        return CallStat(call_expr=CallExpr(function=symtab.find(value), symtab=symtab), symtab=symtab)
-    elif accept('beginsym'):
-        statement_list = StatList(symtab=symtab)
-        statement_list.append(statement(symtab))
-        while accept('semicolon'):
-            statement_list.append(statement(symtab))
-        expect('endsym')
-        statement_list.print_content()
-        return statement_list
-    elif accept('ifsym'):
-        debug("got if")
-        cond = condition(symtab)
-        expect('thensym')
-        then = statement(symtab)
-        debug("got then")
-        if accept('elsesym'):
-            debug("there is the else")
-            else_statements = statement(symtab)
-            return IfStat(cond=cond, thenpart=then, symtab=symtab, elsepart=else_statements)
-        debug("returning if stat if")
-        return IfStat(cond=cond, thenpart=then, symtab=symtab)
-    elif accept('whilesym'):
-        cond = condition(symtab)
-        expect('dosym')
-        body = statement(symtab)
-        return WhileStat(cond=cond, body=body, symtab=symtab)
-    elif accept('print'):
-        expect('ident')
-        # it represent a special node that will
-        # be mapped to a system function call
-        return PrintStat(symbol=symtab.find(value), symtab=symtab)
-    elif accept('input'):
-        expect('ident')
-        return InputStat(symbol=symtab.find(value), symtab=symtab)
-
-
-@logger
-def block(symtab):
-    local_vars = LocalSymbolTable(function_stack.peek(), parent=symtab)
-    defs = DefinitionList()
-    if accept('constsym'):
-        expect('ident')
-        name = value
-        expect('eql')
-        expect('number')
-        # FIXED_ERROR : the constructor had the last parameter outside
-        local_vars.append(Symbol(name, standard_types['int'], value=value, level=function_stack.peek()))
-        while accept('comma'):
-            expect('ident')
-            name = value
-            expect('eql')
-            expect('number')
-            local_vars.append(Symbol(name, standard_types['int'], value=value, level=function_stack.peek()))
-        expect('semicolon')
-    if accept('varsym'):
-        expect('ident')
-        local_vars.append(Symbol(value, standard_types['int'], level=function_stack.peek()))
-        while accept('comma'):
-            expect('ident')
-            local_vars.append(Symbol(value, standard_types['int'], level=function_stack.peek()))
-        expect('semicolon')
-    while accept('procsym'):
-        expect('ident')
-        fname = value
-        fsym = Symbol(fname, standard_types['function'], level=function_stack.peek())
-        function_stack.push(fsym)
-        expect('semicolon')
-        # call block
-        fbody = block(local_vars) # symtab[:] + 
-        function_stack.pop()
-        local_vars.append(fsym)
-        expect('semicolon')
-        defs.append(FunctionDef(symbol=local_vars.find(fname), body=fbody))
-    # this statement represents the main
-    stat = statement(local_vars) # symtab[:] + 
-    return Block(gl_sym=symtab, lc_sym=local_vars, defs=defs, body=stat)
-
-
-@logger
-def program():
-    '''Axiom'''
-    getsym()
-    the_program = block(None)
-    expect('period')
-    return the_program
-
-
-if __name__ == '__main__':
+            self.error("factor: syntax error")
+            self.getsym()
+
+    def term(self, symtab):
+        op = None
+        expr = self.factor(symtab)
+        while self.new_sym in ['times', 'slash', 'mod']:
+            self.getsym()
+            op = self.sym
+            # build and unbalanced tree ( we are keeping the order of the operations)
+            expr2 = self.factor(symtab)
+            expr = BinExpr(children=[op, expr, expr2], symtab=symtab)
+        return expr
 
-    # read from files passed as arguments
-    stop_inbetween = False
+    def expression(self, symtab):
+        op = None
+
+        # takes in account for the first unary operator
+        if self.new_sym in ['plus', 'minus']:
+            self.getsym()
+            op = self.sym
+        expr = self.term(symtab)
+
+        # FIXED_ERROR: i changed 'initial_op' to just 'op' into the constructor of UnExp
+        if op:
+            expr = UnExpr(children=[op, expr], symtab=symtab)
+        while self.new_sym in ['plus', 'minus']:
+            self.getsym()
+            op = self.sym
+            expr2 = self.term(symtab)
+            expr = BinExpr(children=[op, expr, expr2], symtab=symtab)
+        return expr
 
-    the_lexer = None
-    try:
-        if len(argv) == 1:
-            the_lexer = lexer(__test_program)
+    def condition(self, symtab):
+        if self.accept('oddsym'):
+            return UnExpr(children=['odd', self.expression(symtab)], symtab=symtab)
         else:
-            from string import join
-
-            with open(argv[1], "r") as fin:
-                text = join(fin.readlines())
-            the_lexer = lexer(text)
-
-            if len(argv) > 2:
-                stop_inbetween |= bool(argv[2])
-    except Exception:
-        # use the sample program in the lexer module
-        the_lexer = lexer(__test_program)
-
-    debug("#######################################")
-    debug("############## FRONTEND ###############")
-    debug("#######################################")
-
-    # Build the syntactic tree/IR tree
-    res = program()
-
-    print_dotty(res, "log.dot")
-
-    raw_input()
-    res.navigate(constant_propagation)
-
-    res.navigate_postvisit(constant_folding)
-    #debug("printing the result")
-    #print '\n', res, '\n'
-    print_dotty(res, "log.dot")
-    raw_input()
-    if stop_inbetween:
-        raw_input("Press any key to continue...")
-
-    
-    # the whole symbol table
-    # as a tree structure
-    symtab = SymbolTable(res)
-
-    symtab.show_graphviz()
-
-    if stop_inbetween:
-        raw_input("Press any key to continue...")
+            expr = self.expression(symtab)
+            if self.new_sym in ['eql', 'neq', 'lss', 'leq', 'gtr', 'geq']:
+                self.getsym()
+                op = self.sym
+                expr2 = self.expression(symtab)
+                return BinExpr(children=[op, expr, expr2], symtab=symtab)
+            else:
+                self.error("condition: invalid operator")
+                self.getsym()
+
+    def statement(self, symtab):
+        if self.accept('ident'):
+            target = symtab.find(self.value)
+            if target is None and tracer.symtab:
+                tracer.event('symtab', 'undeclared', name=self.value)
+            self.expect('becomes')  # ':='
+            expr = self.expression(symtab)
+
+            return AssignStat(target=target, expr=expr, symtab=symtab)
+        elif self.accept('callsym'):
+            self.expect('ident')
+            # procedures works on global variables, there are no parameters or
+            # return values.
+            return CallStat(call_expr=CallExpr(function=symtab.find(self.value), symtab=symtab), symtab=symtab)
+        elif self.accept('beginsym'):
+            statement_list = StatList(symtab=symtab)
+            statement_list.append(self.statement(symtab))
+            while self.accept('semicolon'):
+                statement_list.append(self.statement(symtab))
+            self.expect('endsym')
+            if tracer.parser >= DEBUG:
+                statement_list.print_content()
+            return statement_list
+        elif self.accept('ifsym'):
+            cond = self.condition(symtab)
+            self.expect('thensym')
+            then = self.statement(symtab)
+            if self.accept('elsesym'):
+                else_statements = self.statement(symtab)
+                return IfStat(cond=cond, thenpart=then, symtab=symtab, elsepart=else_statements)
+            return IfStat(cond=cond, thenpart=then, symtab=symtab)
+        elif self.accept('whilesym'):
+            cond = self.condition(symtab)
+            self.expect('dosym')
+            body = self.statement(symtab)
+            return WhileStat(cond=cond, body=body, symtab=symtab)
+        elif self.accept('print'):
+            self.expect('ident')
+            # it represent a special node that will
+            # be mapped to a system function call
+            return PrintStat(symbol=symtab.find(self.value), symtab=symtab)
+        elif self.accept('input'):
+            self.expect('ident')
+            return InputStat(symbol=symtab.find(self.value), symtab=symtab)
+
+    def declarations(self, local_vars):
+        '''Constant and variable declarations at the start of a block'''
+        level = self.function_stack.peek()
+        if self.accept('constsym'):
+            self.expect('ident')
+            name = self.value
+            self.expect('eql')
+            self.expect('number')
+            local_vars.append(Symbol(name, standard_types['int'], value=self.value, level=level))
+            while self.accept('comma'):
+                self.expect('ident')
+                name = self.value
+                self.expect('eql')
+                self.expect('number')
+                local_vars.append(Symbol(name, standard_types['int'], value=self.value, level=level))
+            self.expect('semicolon')
+        if self.accept('varsym'):
+            self.expect('ident')
+            local_vars.append(Symbol(self.value, standard_types['int'], level=level))
+            while self.accept('comma'):
+                self.expect('ident')
+                local_vars.append(Symbol(self.value, standard_types['int'], level=level))
+            self.expect('semicolon')
+
+    def block(self, symtab):
+        function_stack = self.function_stack
+        local_vars = LocalSymbolTable(function_stack.peek(), parent=symtab)
+        defs = DefinitionList()
+        self.declarations(local_vars)
+        while self.accept('procsym'):
+            self.expect('ident')
+            fname = self.value
+            fsym = Symbol(fname, standard_types['function'], level=function_stack.peek())
+            function_stack.push(fsym)
+            self.expect('semicolon')
+            # call block
+            fbody = self.block(local_vars) # symtab[:] + 
+            function_stack.pop()
+            local_vars.append(fsym)
+            self.expect('semicolon')
+            defs.append(FunctionDef(symbol=local_vars.find(fname), body=fbody))
+        # this statement represents the main
+        stat = self.statement(local_vars) # symtab[:] + 
+        return Block(gl_sym=symtab, lc_sym=local_vars, defs=defs, body=stat)
+
+    def program(self):
+        '''Axiom'''
+        # parsing always starts from the beginning of the buffer
+        self.token_index = 0
+        self.getsym()
+        the_program = self.block(None)
+        self.expect('period')
+        return the_program
+
+
+class Call(object):
+    '''Yielded by a rule of the IterativeParser to parse a sub-rule'''
+    __slots__ = ('rule', 'symtab')
+
+    def __init__(self, rule, symtab):
+        self.rule = rule
+        self.symtab = symtab
+
+
+class IterativeParser(Parser):
+    '''Same grammar and IR as Parser, with the nesting kept on an explicit stack
+    Every rule is a generator: it yields a Call to parse a sub-rule, receives
+    the resulting node, and yields its own node (anything but a Call) at the end.
+    The generators wait on a list, so the depth of begin/end blocks, if/while
+    statements, parentheses and procedures is bounded by memory only.'''
+
+    # the rules are generators, only the whole parse is traced
+    grammar_rules = ('program',)
+
+    def run(self, rule, symtab):
+        '''Parse rule with an explicit stack of suspended rules, return its node'''
+        stack = [rule(symtab)]
+        result = None
+        while stack:
+            step = stack[-1].send(result)
+            if type(step) is Call:
+                stack.append(step.rule(step.symtab))
+                result = None
+            else:
+                stack.pop().close()
+                result = step
+        return result
+
+    def factor(self, symtab):
+        if self.new_sym == 'lparen':
+            self.getsym()
+            expr = yield Call(self.expression, symtab)
+            self.expect('rparen')
+            yield expr
+        else:
+            # identifiers and numbers do not nest
+            yield Parser.factor(self, symtab)
+
+    def term(self, symtab):
+        expr = yield Call(self.factor, symtab)
+        while self.new_sym in ['times', 'slash', 'mod']:
+            self.getsym()
+            op = self.sym
+            expr2 = yield Call(self.factor, symtab)
+            expr = BinExpr(children=[op, expr, expr2], symtab=symtab)
+        yield expr
+
+    def expression(self, symtab):
+        op = None
+        if self.new_sym in ['plus', 'minus']:
+            self.getsym()
+            op = self.sym
+        expr = yield Call(self.term, symtab)
+        if op:
+            expr = UnExpr(children=[op, expr], symtab=symtab)
+        while self.new_sym in ['plus', 'minus']:
+            self.getsym()
+            op = self.sym
+            expr2 = yield Call(self.term, symtab)
+            expr = BinExpr(children=[op, expr, expr2], symtab=symtab)
+        yield expr
+
+    def condition(self, symtab):
+        if self.accept('oddsym'):
+            expr = yield Call(self.expression, symtab)
+            yield UnExpr(children=['odd', expr], symtab=symtab)
+        else:
+            expr = yield Call(self.expression, symtab)
+            if self.new_sym in ['eql', 'neq', 'lss', 'leq', 'gtr', 'geq']:
+                self.getsym()
+                op = self.sym
+                expr2 = yield Call(self.expression, symtab)
+                yield BinExpr(children=[op, expr, expr2], symtab=symtab)
+            else:
+                self.error("condition: invalid operator")
+                self.getsym()
+                yield None
+
+    def statement(self, symtab):
+        if self.accept('ident'):
+            target = symtab.find(self.value)
+            if target is None and tracer.symtab:
+                tracer.event('symtab', 'undeclared', name=self.value)
+            self.expect('becomes')
+            expr = yield Call(self.expression, symtab)
+            yield AssignStat(target=target, expr=expr, symtab=symtab)
+        elif self.accept('beginsym'):
+            statement_list = StatList(symtab=symtab)
+            statement_list.append((yield Call(self.statement, symtab)))
+            while self.accept('semicolon'):
+                statement_list.append((yield Call(self.statement, symtab)))
+            self.expect('endsym')
+            if tracer.parser >= DEBUG:
+                statement_list.print_content()
+            yield statement_list
+        elif self.accept('ifsym'):
+            cond = yield Call(self.condition, symtab)
+            self.expect('thensym')
+            then = yield Call(self.statement, symtab)
+            if self.accept('elsesym'):
+                else_statements = yield Call(self.statement, symtab)
+                yield IfStat(cond=cond, thenpart=then, symtab=symtab, elsepart=else_statements)
+            else:
+                yield IfStat(cond=cond, thenpart=then, symtab=symtab)
+        elif self.accept('whilesym'):
+            cond = yield Call(self.condition, symtab)
+            self.expect('dosym')
+            body = yield Call(self.statement, symtab)
+            yield WhileStat(cond=cond, body=body, symtab=symtab)
+        else:
+            # calls, prints and inputs do not nest
+            yield Parser.statement(self, symtab)
+
+    def block(self, symtab):
+        function_stack = self.function_stack
+        local_vars = LocalSymbolTable(function_stack.peek(), parent=symtab)
+        defs = DefinitionList()
+        self.declarations(local_vars)
+        while self.accept('procsym'):
+            self.expect('ident')
+            fname = self.value
+            fsym = Symbol(fname, standard_types['function'], level=function_stack.peek())
+            function_stack.push(fsym)
+            self.expect('semicolon')
+            fbody = yield Call(self.block, local_vars)
+            function_stack.pop()
+            local_vars.append(fsym)
+            self.expect('semicolon')
+            defs.append(FunctionDef(symbol=local_vars.find(fname), body=fbody))
+        stat = yield Call(self.statement, local_vars)
+        yield Block(gl_sym=symtab, lc_sym=local_vars, defs=defs, body=stat)
+
+    def program(self):
+        '''Axiom'''
+        self.token_index = 0
+        self.getsym()
+        the_program = self.run(self.block, None)
+        self.expect('period')
+        return the_program
+
+
+# The grammar of the README in the notation of ll1.py, with the tokens of the
+# lexer ("!" and "?" take an identifier, "%" is the modulo): the repetitions
+# are right recursive rules, $ marks the tokens whose value the actions use
+GRAMMAR = '''
+program        = block period eof .
+
+block          = @scope constants variables procedures statement @block .
+constants      = constsym $ident eql $number @constant more_constants semicolon | .
+more_constants = comma $ident eql $number @constant more_constants | .
+variables      = varsym $ident @variable more_variables semicolon | .
+more_variables = comma $ident @variable more_variables | .
+procedures     = procsym $ident @procedure semicolon block @end_procedure semicolon procedures | .
+
+statement      = $ident @target becomes expression @assign
+               | callsym $ident @call
+               | print $ident @print
+               | input $ident @input
+               | beginsym @begin statement @append statements endsym @end
+               | ifsym condition thensym statement else_part
+               | whilesym condition dosym statement @while
+               | @empty .
+statements     = semicolon statement @append statements | .
+else_part      = elsesym statement @if_else | @if .
+
+condition      = oddsym expression @odd
+               | expression relation expression @binary .
+relation       = $eql | $neq | $lss | $leq | $gtr | $geq .
+
+expression     = $plus term @unary more_terms | $minus term @unary more_terms | term more_terms .
+more_terms     = $plus term @binary more_terms | $minus term @binary more_terms | .
+term           = factor more_factors .
+more_factors   = $times factor @binary more_factors | $slash factor @binary more_factors
+               | $mod factor @binary more_factors | .
+factor         = $ident @var | $number @const | lparen expression rparen .
+'''
+
+
+class TableParser(Parser):
+    '''LL(1) parser driven by the table of GRAMMAR, same IR as Parser
+    The table dispatches on the integer token kinds of the buffer; the on_*
+    methods are the semantic actions, they pop their operands from the value
+    stack and push the node they build. The nesting is kept on the stack of
+    the table, as in the IterativeParser.
+    A new construct takes a rule in GRAMMAR and an on_* method for each of its actions.'''
+
+    grammar_rules = ('program',)
+
+    # built on first use, shared by all the instances
+    table = None
+
+    @classmethod
+    def parsing_table(cls):
+        if cls.table is None:
+            from ll1 import Grammar
+            grammar = Grammar(GRAMMAR, token_names)
+            actions = dict((name[3:], getattr(cls, name).im_func) for name in dir(cls) if name.startswith('on_'))
+            cls.table = grammar.table(actions)
+        return cls.table
+
+    def program(self):
+        '''Axiom'''
+        from ll1 import ParseError
+        table = self.parsing_table()
+        # scopes of the blocks being parsed, the innermost last
+        self.scopes = []
+        try:
+            return table.parse(self.tokens.kinds, self.tokens.values, self)[0]
+        except ParseError, e:
+            # point the diagnostic at the offending token
+            self.token_index = min(e.index, len(self.tokens) - 1) + 1
+            self.new_sym = self.tokens.name(e.index) if e.index < len(self.tokens) else None
+            self.new_value = self.tokens.value(e.index) if e.index < len(self.tokens) else None
+            self.error(str(e))
+
+    # semantic actions
+
+    def on_scope(self, out):
+        parent = self.scopes[-1] if self.scopes else None
+        self.scopes.append(LocalSymbolTable(self.function_stack.peek(), parent=parent))
+        out.append(DefinitionList())
+
+    def on_block(self, out):
+        stat = out.pop()
+        defs = out.pop()
+        local_vars = self.scopes.pop()
+        out.append(Block(gl_sym=local_vars.parent, lc_sym=local_vars, defs=defs, body=stat))
+
+    def on_constant(self, out):
+        value = out.pop()
+        name = out.pop()
+        self.scopes[-1].append(Symbol(name, standard_types['int'], value=value, level=self.function_stack.peek()))
+
+    def on_variable(self, out):
+        self.scopes[-1].append(Symbol(out.pop(), standard_types['int'], level=self.function_stack.peek()))
+
+    def on_procedure(self, out):
+        fsym = Symbol(out.pop(), standard_types['function'], level=self.function_stack.peek())
+        self.function_stack.push(fsym)
+        out.append(fsym)
+
+    def on_end_procedure(self, out):
+        fbody = out.pop()
+        fsym = out.pop()
+        self.function_stack.pop()
+        local_vars = self.scopes[-1]
+        local_vars.append(fsym)
+        # the definitions of the enclosing block are below
+        out[-1].append(FunctionDef(symbol=local_vars.find(fsym.name), body=fbody))
 
-    debug("#######################################")
-    debug("######### CONTROL FLOW GRAPH ##########")
-    debug("#######################################")
-    # build the CFG from the IR
-    cfg = CFG(res)
-    
-    # show the CFG for each
-    # function
-    cfg.graphviz()
+    def on_target(self, out):
+        name = out.pop()
+        target = self.scopes[-1].find(name)
+        if target is None and tracer.symtab:
+            tracer.event('symtab', 'undeclared', name=name)
+        out.append(target)
 
-    if stop_inbetween:
-        raw_input("Press any key to continue...")
+    def on_assign(self, out):
+        expr = out.pop()
+        out.append(AssignStat(target=out.pop(), expr=expr, symtab=self.scopes[-1]))
 
-    # put the CFG into three_addr_form form
-    cfg.three_addr_form()
+    def on_call(self, out):
+        symtab = self.scopes[-1]
+        out.append(CallStat(call_expr=CallExpr(function=symtab.find(out.pop()), symtab=symtab), symtab=symtab))
 
-    # show the CFG in three_addr_form for each
-    # function
-    cfg.graphviz()
+    def on_print(self, out):
+        symtab = self.scopes[-1]
+        out.append(PrintStat(symbol=symtab.find(out.pop()), symtab=symtab))
 
-    if stop_inbetween:
-        raw_input("Press any key to continue...")
+    def on_input(self, out):
+        symtab = self.scopes[-1]
+        out.append(InputStat(symbol=symtab.find(out.pop()), symtab=symtab))
 
+    def on_begin(self, out):
+        out.append(StatList(symtab=self.scopes[-1]))
 
-    debug("#######################################")
-    debug("############ CALL GRAPH ###############")
-    debug("#######################################")
+    def on_append(self, out):
+        stat = out.pop()
+        out[-1].append(stat)
 
-    call_graph = CallGraph(cfg, symtab)
+    def on_end(self, out):
+        if tracer.parser >= DEBUG:
+            out[-1].print_content()
 
-    call_graph.graphviz()
-    
+    def on_if(self, out):
+        then = out.pop()
+        cond = out.pop()
+        out.append(IfStat(cond=cond, thenpart=then, symtab=self.scopes[-1]))
 
-    if stop_inbetween:
-        raw_input("Press any key to continue...")
+    def on_if_else(self, out):
+        else_statements = out.pop()
+        then = out.pop()
+        cond = out.pop()
+        out.append(IfStat(cond=cond, thenpart=then, symtab=self.scopes[-1], elsepart=else_statements))
 
+    def on_while(self, out):
+        body = out.pop()
+        cond = out.pop()
+        out.append(WhileStat(cond=cond, body=body, symtab=self.scopes[-1]))
 
-    debug("#######################################")
-    debug("############ DATA LAYOUT ##############")
-    debug("#######################################")
+    def on_empty(self, out):
+        out.append(None)
 
-    data_layout(symtab, call_graph)
+    def on_odd(self, out):
+        out.append(UnExpr(children=['odd', out.pop()], symtab=self.scopes[-1]))
 
+    def on_binary(self, out):
+        expr2 = out.pop()
+        op = out.pop()
+        expr = out.pop()
+        out.append(BinExpr(children=[op, expr, expr2], symtab=self.scopes[-1]))
 
-    if stop_inbetween:
-        raw_input("Press any key to continue...")
+    def on_unary(self, out):
+        expr = out.pop()
+        out.append(UnExpr(children=[out.pop(), expr], symtab=self.scopes[-1]))
 
+    def on_var(self, out):
+        symtab = self.scopes[-1]
+        out.append(Var(var=symtab.find(out.pop()), symtab=symtab))
 
-    debug("#######################################")
-    debug("########### LIVENESS GRAPH ############")
-    debug("#######################################")
+    def on_const(self, out):
+        out.append(Const(value=out.pop(), symtab=self.scopes[-1]))
 
-    liveness_graphs = cfg.liveness_graphs(show=True)
 
-    cfg.graphviz()
+# parsing modes, the iterative and the table-driven ones have no limit on the nesting depth
+PARSERS = {
+    'recursive': Parser,
+    'iterative': IterativeParser,
+    'table': TableParser,
+}
 
 
-    if stop_inbetween:
-        raw_input("Press any key to continue...")
+def parse_file(filename, mode='recursive'):
+    '''Parse a source file, return the IR tree and the parser'''
+    parser = PARSERS[mode](TokenBuffer(stream_lexer(filename)))
+    return parser.program(), parser
 
-    debug("#######################################")
-    debug("######## REGISTER ALLOCATION ##########")
-    debug("#######################################")
 
-    register_allocator = RegisterAllocator(liveness_graphs, cfg)
+def parse_text(text, mode='recursive'):
+    '''Parse a program given as a string, return the IR tree and the parser'''
+    parser = PARSERS[mode](TokenBuffer(positioned_lexer(text)))
+    return parser.program(), parser
 
-    if stop_inbetween:
-        raw_input("Press any key to continue...")
 
-    cfg.code_generation("main.s")
+if __name__ == '__main__':
+    import argparse
+    from pipeline import compile_file, compile_text, CompilationError, PARSING
+
+    argparser = argparse.ArgumentParser(description="PL/0 compiler, runs headless unless asked otherwise")
+    argparser.add_argument("source", nargs="?", help="PL/0 source file (the sample program if omitted)")
+    argparser.add_argument("-o", "--output", default="main.s", help="assembly output file")
+    argparser.add_argument("--dot", metavar="FILE", help="write the dot representation of the IR to FILE")
+    argparser.add_argument("--show", action="store_true", help="render and open the Graphviz diagrams")
+    argparser.add_argument("--pause", action="store_true", help="wait for a key press between the phases")
+    argparser.add_argument("--cache", metavar="DIR", help="reuse the assembly of unchanged programs cached in DIR")
+    argparser.add_argument("--cache-size", type=int, default=64, metavar="MB", help="size bound of the cache")
+    argparser.add_argument("--incremental", action="store_true",
+                           help="with --cache, recompile only the procedures that changed")
+    argparser.add_argument("--report", metavar="FILE", help="write the time and the counters of each phase to FILE")
+    argparser.add_argument("--memory", action="store_true",
+                           help="with --report, add the memory use and the census of the live objects")
+    argparser.add_argument("--parser", choices=sorted(PARSERS), default=PARSING,
+                           help="parsing mode, the recursive one is limited in the nesting depth")
+    args = argparser.parse_args()
+
+    options = dict(output=args.output, show=args.show, pause=args.pause, dot_file=args.dot, parsing=args.parser)
+    if args.cache:
+        from cache import CompilationCache
+        options['cache'] = CompilationCache(args.cache, args.cache_size * 1024 * 1024)
+        options['incremental'] = args.incremental
+    if args.report:
+        from metrics import PhaseReport
+        options['report'] = PhaseReport(args.source, memory=args.memory)
+    try:
+        if args.source is None:
+            # use the sample program in the lexer module
+            compile_text(__test_program, **options)
+        else:
+            compile_file(args.source, **options)
+    except CompilationError:
+        sys.exit(1)
+    finally:
+        if args.report:
+            options['report'].write(args.report)
 
     print("End of compilation")
 
@@ -0,0 +1,91 @@
+#!/usr/bin/python
+
+__doc__ = '''Per-procedure fingerprints for the incremental recompilation
+The code generated for a procedure depends only on its CFG, its symbol table and
+on the stack layout of the frames it touches: its own, the ones of the procedures
+it calls and the ones of the procedures whose variables it uses (see CallGraph).
+A fingerprint hashes exactly these inputs, so that the cached assembly of a
+procedure whose fingerprint did not change can be reused as it is.'''
+
+import hashlib
+
+from ir import Symbol, IRNode, FunctionType, LabelType, procedure_label, instance_fields
+from cfg import BasicBlock
+
+# references to the enclosing nodes and to the symbol tables, which are
+# hashed separately, and labels of the IR, which do not reach the assembly
+SKIPPED_FIELDS = frozenset(['parent', 'parent_slot', 'symtab', 'local_symtab', 'global_symtab', 'defs', 'label',
+                            'function_label'])
+
+
+def symbol_signature(sym):
+    if isinstance(sym.stype, FunctionType):
+        return 'proc:' + procedure_label(sym)
+    if isinstance(sym.stype, LabelType):
+        return 'label'
+    res = sym.stype.name + ':'
+    if sym.level is not None:
+        res += procedure_label(sym.level)
+    res += '.' + sym.name
+    if sym.value is not None:
+        res += '=' + str(sym.value)
+    return res
+
+
+def signature(value, out):
+    '''Append to out a textual representation of an IR value that does not
+    depend on the identity of the objects'''
+    if isinstance(value, Symbol):
+        out.append(symbol_signature(value))
+    elif isinstance(value, BasicBlock):
+        out.append('@' + value.lbl_begin)
+    elif isinstance(value, (list, tuple)):
+        out.append('[')
+        for v in value:
+            signature(v, out)
+        out.append(']')
+    elif isinstance(value, (set, frozenset)):
+        items = []
+        for v in value:
+            item = []
+            signature(v, item)
+            items.append(' '.join(item))
+        out.append('{' + ', '.join(sorted(items)) + '}')
+    elif isinstance(value, IRNode):
+        out.append(type(value).__name__ + '(')
+        for name in sorted(instance_fields(value)):
+            if name not in SKIPPED_FIELDS:
+                out.append(name + '=')
+                signature(getattr(value, name), out)
+        out.append(')')
+    elif value is None or isinstance(value, (int, long, str, unicode, bool)):
+        out.append(repr(value))
+    else:
+        # e.g. types, only their kind matters
+        out.append(type(value).__name__)
+
+
+def procedure_fingerprint(fsym, symtab, cfg, call_graph, salt=''):
+    '''Fingerprint of the code of a procedure, to be computed after the data layout
+    and before the CFG is put in three address form'''
+    h = hashlib.sha1(salt)
+    h.update(procedure_label(fsym) + '\n')
+
+    out = []
+    signature(list(symtab.get_symtab_dict()[fsym]), out)
+
+    # the frames accessed by the code of the procedure
+    frames = set([fsym]) | call_graph.function_calls[fsym] | call_graph.function_uses[fsym]
+    for frame in sorted(frames, key=procedure_label):
+        out.append('frame ' + procedure_label(frame))
+        signature(frame.stack, out)
+
+    for BB in cfg.BB_list[fsym]:
+        out.append('\n' + BB.lbl_begin + ':')
+        for kind in sorted(BB.children):
+            out.append(kind + '=')
+            signature(BB.children[kind], out)
+        signature(BB.instrs, out)
+
+    h.update(' '.join(out))
+    return h.hexdigest()
@@ -1,7 +1,10 @@
 #!/usr/bin/python
 
 from support import debug
-from graphviz import Digraph
+from logger import tracer, DEBUG
+import copy_reg
+from visualisation import Digraph
+from traversal import preorder, postorder
 
 __doc__ = '''Intermediate Representation
 Could be improved by relying less on class hierarchy and more on string tags and/or duck typing
@@ -63,15 +66,29 @@ class FunctionType(Type):
 
 
 class Symbol(object):
+    # fixed layout, there is one symbol per variable, temporary and register;
+    # stack is set on the procedures by the data layout, label on the
+    # procedures that repeat the name of another one in the same scope
+    __slots__ = ('name', 'stype', 'value', 'level', 'temp', '_address', 'stack', 'label')
+
     def __init__(self, name, stype, value=None, level=None, temp=False):
         self.name = name  # string that identifies it
         self.stype = stype
         self.value = value  # if not None, it is a constant
         self.level = level
         self.temp = temp
-        self.address = dict()
+        self._address = None
+        self.label = None
         #debug("Created : " + self.name + " Value : " + str(self.value))
 
+    @property
+    def address(self):
+        '''Register of the symbol in every procedure (fsym -> register number),
+        allocated on first use: constants and labels never get one'''
+        if self._address is None:
+            self._address = dict()
+        return self._address
+
     # the way in which we can implement the printing facilities
 
     def instr_dot_repr(self):
@@ -80,7 +97,7 @@ class Symbol(object):
 
     def __repr__(self):
         return self.stype.name + ' ' + self.name + " " + (self.value if type(self.value) == str else '') + " " + \
-               (("address : " + str(self.address)) if self.address else '')
+               (("address : " + str(self._address)) if self._address else '')
 
 
 class RegisterType(Type):
@@ -146,8 +163,28 @@ standard_types = {
 
 function_labels = {}
 
+
+def procedure_label(fsym):
+    '''Assembly label of a procedure: the path of its enclosing procedures,
+    stable across compilations (PL/0 identifiers cannot contain dots).
+    A procedure declared with the name of an earlier one of the same scope
+    is prefixed by its index among the declarations (global.1.p), which no
+    identifier and no block label (global.1) can be'''
+    names = [fsym.label or fsym.name]
+    while fsym.level is not None and fsym.level is not fsym:
+        fsym = fsym.level
+        names.append(fsym.label or fsym.name)
+    return '.'.join(reversed(names))
+
+def procedure_blocks(block):
+    '''Blocks of the procedures defined in block'''
+    return [c.body for c in block.defs.children]
+
 # it is implemented as a list (it is its extension)
 class LocalSymbolTable(list):
+    # bumped every time a symbol is declared in any table:
+    # lookups cached from the ancestors before that are dropped
+    generation = 0
 
     def __init__(self, fsym, parent=None):
         super(LocalSymbolTable,self).__init__()
@@ -158,20 +195,87 @@ class LocalSymbolTable(list):
 
         self.temp_counter = 0
 
+        # name -> first symbol with that name in this table
+        self.index = dict()
+        # name -> symbol found in one of the ancestors
+        self.resolved = dict()
+        self.resolved_generation = LocalSymbolTable.generation
+
+    # the list API is kept, the index follows every change of the list
+    def append(self, symb):
+        super(LocalSymbolTable, self).append(symb)
+        if symb.name not in self.index:
+            self.index[symb.name] = symb
+        LocalSymbolTable.generation += 1
+
+    def extend(self, symbols):
+        for symb in symbols:
+            self.append(symb)
+
+    def __iadd__(self, symbols):
+        self.extend(symbols)
+        return self
+
+    def reindex(self):
+        self.index = dict()
+        for symb in reversed(self):
+            self.index[symb.name] = symb
+        LocalSymbolTable.generation += 1
+
+    def insert(self, idx, symb):
+        super(LocalSymbolTable, self).insert(idx, symb)
+        self.reindex()
+
+    def remove(self, symb):
+        super(LocalSymbolTable, self).remove(symb)
+        self.reindex()
+
+    def pop(self, *args):
+        symb = super(LocalSymbolTable, self).pop(*args)
+        self.reindex()
+        return symb
+
+    def __setitem__(self, idx, symb):
+        super(LocalSymbolTable, self).__setitem__(idx, symb)
+        self.reindex()
+
+    def __delitem__(self, idx):
+        super(LocalSymbolTable, self).__delitem__(idx)
+        self.reindex()
+
+    # pickling: the symbols are restored together with the attributes, the
+    # default protocol would append them before the index exists
+    def __reduce_ex__(self, protocol):
+        return copy_reg.__newobj__, (type(self),), (self.__dict__, list(self))
+
+    def __setstate__(self, state):
+        attributes, symbols = state
+        self.__dict__.update(attributes)
+        super(LocalSymbolTable, self).extend(symbols)
+        self.reindex()
+
     # find an object by its name
     def find(self, name):
-        print 'Looking up', name
-        for s in self:
-            if s.name == name:
-                return s
-        if self.parent == None:
-            return None 
-        
-        symb = self.parent.find(name)
+        if tracer.symtab >= DEBUG:
+            tracer.event('symtab', 'lookup', name=name)
+        symb = self.index.get(name)
+        if symb is not None:
+            return symb
+        if self.parent is None:
+            return None
+
+        if self.resolved_generation != LocalSymbolTable.generation:
+            self.resolved.clear()
+            self.resolved_generation = LocalSymbolTable.generation
+
+        symb = self.resolved.get(name)
+        if symb is None:
+            symb = self.parent.find(name)
+            if symb is not None:
+                self.resolved[name] = symb
+            elif tracer.symtab >= DEBUG:
+                tracer.event('symtab', 'lookup_failed', name=name)
 
-        if symb == None:
-            print 'Looking up failed!'
-        
         return symb
 
     def get_external_var(self):
@@ -263,30 +367,117 @@ class SymbolTable():
 
     def __gather_symtab(self, ir):
 
-        local_symtab = ir.local_symtab
-        self.symtab_dict[local_symtab.fsym] = local_symtab
-        for c in ir.defs.children:
-            local_symtab.children.append(c.body.local_symtab)
-            self.__gather_symtab(c.body)
+        for block in preorder(ir, procedure_blocks, unique=False):
+            local_symtab = block.local_symtab
+            self.symtab_dict[local_symtab.fsym] = local_symtab
+            names = set()
+            for idx, c in enumerate(block.defs.children):
+                local_symtab.children.append(c.body.local_symtab)
+                # the labels of homonymous procedures must differ
+                fsym = c.body.local_symtab.fsym
+                if fsym.name in names:
+                    fsym.label = str(idx) + '.' + fsym.name
+                names.add(fsym.name)
 
     def get_symtab_dict(self):
         return self.symtab_dict
 
 
+# class -> names of the slots of the class and of its bases
+_slot_names = dict()
+
+
+def instance_fields(obj):
+    '''Names of the attributes set on obj, what vars() gives for the classes
+    without slots'''
+    cls = type(obj)
+    names = _slot_names.get(cls)
+    if names is None:
+        names = []
+        for klass in reversed(cls.__mro__):
+            for name in klass.__dict__.get('__slots__', ()):
+                if name not in names:
+                    names.append(name)
+        _slot_names[cls] = names
+    fields = [name for name in names if hasattr(obj, name)]
+    fields.extend(getattr(obj, '__dict__', ()))
+    return fields
+
 # IRNODE
+# attributes that can hold other nodes, besides the children
+NODE_ATTRIBUTES = set(['body', 'cond', 'value', 'thenpart', 'elsepart', 'symbol', 'call', 'step', 'expr', 'target',
+                       'defs', 'global_symtab', 'local_symtab'])
+
+
 class IRNode(object):
+    # every subclass lists the attributes it adds: the nodes have no __dict__
+    # parent_slot is where the node is held by its parent: an index in the
+    # children or the name of one of the node_fields
+    __slots__ = ('parent', 'parent_slot', 'children', 'symtab')
+    # attributes holding a single child node (or None), visited in this order
+    # after the children list
+    node_fields = ()
+
     def __init__(self, parent=None, children=None, symtab=None):
         self.parent = parent
         if children:
             self.children = children
         else:
             self.children = []
-        for c in self.children:
-            if 'parent' in dir(c):
-                c.parent = self
+        for i, c in enumerate(self.children):
+            if hasattr(c, 'parent'):
+                self.adopt(c, i)
 
         self.symtab = symtab
 
+    def adopt(self, node, slot):
+        '''Make node the child held by this one at slot'''
+        node.parent = self
+        node.parent_slot = slot
+
+    def reindex(self, start=0):
+        '''Record again the slots of the children from start on, after the
+        children list has been spliced'''
+        children = self.children
+        for i in range(start, len(children)):
+            c = children[i]
+            if isinstance(c, IRNode) and c.parent is self:
+                c.parent_slot = i
+
+    def slot_of(self, node):
+        '''Slot of node in this one, None if node is not one of its children.
+        The slot recorded by the node is checked, the children are searched
+        only for the nodes that do not point back to their parent (such as
+        the operands of the MIPS statements)'''
+        if node.parent is self:
+            slot = getattr(node, 'parent_slot', None)
+            if type(slot) is int:
+                if slot < len(self.children) and self.children[slot] is node:
+                    return slot
+            elif slot is not None and getattr(self, slot) is node:
+                return slot
+        children = getattr(self, 'children', ())
+        if node in children:
+            return children.index(node)
+        for d in self.node_fields:
+            if getattr(self, d) is node:
+                return d
+        return None
+
+    def node_attributes(self):
+        '''Names of the NODE_ATTRIBUTES set on this node'''
+        return set([d for d in NODE_ATTRIBUTES if hasattr(self, d)])
+
+    def child_nodes(self):
+        '''The nodes below this one: the nodes among the children, then the
+        nodes in the node_fields (operators, symbols and None are skipped)'''
+        res = [c for c in getattr(self, 'children', ()) if isinstance(c, IRNode)]
+        for name in self.node_fields:
+            node = getattr(self, name)
+            if isinstance(node, IRNode):
+                res.append(node)
+        return res
+
     def get_uses(self):
         return set()
 
@@ -302,9 +493,7 @@ class IRNode(object):
 
     def __repr__(self):
         from string import split, join
-        attrs = set(
-            ['body', 'cond', 'value', 'thenpart', 'elsepart', 'symbol', 'call', 'step', 'expr', 'target', 'defs',
-             'global_symtab', 'local_symtab']) & set(dir(self))
+        attrs = self.node_attributes()
 
         res = repr(type(self)) + ' ' + str(id(self)) + ' {\n'
         try:
@@ -312,7 +501,7 @@ class IRNode(object):
             res = label.name + ': ' + res
         except Exception, e:
             pass
-        if 'children' in dir(self) and len(self.children):
+        if hasattr(self, 'children') and len(self.children):
             res += '\tchildren:\n'
             for node in self.children:
                 rep = repr(node)
@@ -327,7 +516,7 @@ class IRNode(object):
     
     def constant_propagation(self):
         # indexes of children which are constant var
-        if "children" not in dir(self):
+        if not hasattr(self, 'children'):
             return
         indexs = []
 
@@ -342,90 +531,63 @@ class IRNode(object):
         for idx in indexs:
             c = self.children[idx]
             value = c.symbol.value
-            self.children[idx] = Const(parent=self, value=value)#, symb=c.symbol)
+            self.children[idx] = Const(value=value)#, symb=c.symbol)
+            self.adopt(self.children[idx], idx)
+
 
+    def _symbol_operands(self):
+        '''Symbols and nodes searched by _get_symbol_level'''
+        return getattr(self, 'children', ())
 
     def _get_symbol_level(self):
         
         res = set()
 
-        if 'children' not in dir(self):
-            return res
-
-        for c in self.children:
-            # if is a symbol and not a function call and not a constant
-            if isinstance(c, Symbol) and \
-               not isinstance(c.stype, FunctionType) and\
-               c.value is None :
-                print("found " + c.name)
-                res.add(c.level)
-            elif isinstance(c, IRNode):
-                res.update(c._get_symbol_level())
+        operand_nodes = lambda node: [c for c in node._symbol_operands() if isinstance(c, IRNode)]
+        for node in preorder(self, operand_nodes, unique=False):
+            for c in node._symbol_operands():
+                # if is a symbol and not a function call and not a constant
+                if isinstance(c, Symbol) and \
+                   not isinstance(c.stype, FunctionType) and\
+                   c.value is None :
+                    if tracer.cfg >= DEBUG:
+                        tracer.event('cfg', 'symbol_level', name=c.name)
+                    res.add(c.level)
         return res
 
 
     def navigate_postvisit(self, action):
-        # call action on the self node
-        attrs = set(
-            ['body', 'cond', 'value', 'thenpart', 'elsepart', 'symbol', 'call', 'step', 'expr', 'target', 'defs',
-             'global_symtab', 'local_symtab']) & set(dir(self))
-        if 'children' in dir(self) and len(self.children):
-            # print 'navigating children of', type(self), id(self), len(self.children)
-            for i in range(len(self.children)):
-                try:
-                    self.children[i].navigate_postvisit(action)
-                except Exception:
-                    pass
-        for d in attrs:
-            try:
-                getattr(self, d).navigate_postvisit(action)
-            except Exception:
-                pass
-
-        action(self)
+        # the action may replace the node in its parent: the children
+        # to visit are collected before
+        for node in postorder(self, IRNode.child_nodes, unique=False):
+            action(node)
 
 
     def navigate(self, action):
-        # call action on the self node
-        action(self)
-        attrs = set(
-            ['body', 'cond', 'value', 'thenpart', 'elsepart', 'symbol', 'call', 'step', 'expr', 'target', 'defs',
-             'global_symtab', 'local_symtab']) & set(dir(self))
-        if 'children' in dir(self) and len(self.children):
-            # print 'navigating children of', type(self), id(self), len(self.children)
-            for i in range(len(self.children)):
-                try:
-                    self.children[i].navigate(action)
-                except Exception:
-                    pass
-        for d in attrs:
-            try:
-                getattr(self, d).navigate(action)
-            except Exception:
-                pass
+        # call action on the self node, then on the children it leaves
+        for node in preorder(self, IRNode.child_nodes, unique=False):
+            action(node)
 
     def replace(self, old, new):
-        debug("#### replacing " + str(id(old)) + " with " + str(id(new)))
-        if 'children' in dir(self) and len(self.children) and old in self.children:
-            self.children[self.children.index(old)] = new
-            return True
-        attrs = set(
-            ['body', 'cond', 'value', 'thenpart', 'elsepart', 'symbol', 'call', 'step', 'expr', 'target', 'defs',
-             'global_symtab', 'local_symtab']) & set(dir(self))
-        for d in attrs:
-            try:
-                if getattr(self, d) == old:
-                    setattr(self, d, new)
-                    return True
-            except Exception:
-                pass
-        return False
+        if tracer.ir >= DEBUG:
+            tracer.event('ir', 'replace', old=id(old), new=id(new))
+        slot = self.slot_of(old)
+        if slot is None:
+            return False
+        if type(slot) is int:
+            self.children[slot] = new
+        else:
+            setattr(self, slot, new)
+        self.adopt(new, slot)
+        return True
 
     def to_three_addr_form(self):
         return self
 
 
 class Register(IRNode):
+    __slots__ = ('symbol',)
+
     def __init__(self, parent=None, symbol=None, symtab=None):
         self.parent = parent
         self.symbol = symbol
@@ -440,6 +602,8 @@ class Register(IRNode):
 
 # CONST and VAR
 class Const(IRNode):
+    __slots__ = ('value', 'symbol')
+
     def __init__(self, parent=None, value=0, symb=None, symtab=None):
         self.parent = parent
         self.value = value
@@ -451,6 +615,8 @@ class Const(IRNode):
 
 
 class Var(IRNode):
+    __slots__ = ('symbol', 'name')
+
     def __init__(self, parent=None, var=None, symtab=None):
         self.parent = parent
         # Symbol object representing the variable
@@ -459,27 +625,20 @@ class Var(IRNode):
         self.name = var
         self.symtab = symtab
 
-        self.address = dict()
-
     def collect_uses(self):
         return [self.symbol]
 
     def instr_dot_repr(self):
         return self.symbol.instr_dot_repr()
 
-    def _get_symbol_level(self):
-        res = set()
-        c = self.symbol
-        if isinstance(c, Symbol) and \
-           not isinstance(c.stype, FunctionType) and\
-           c.value is None :
-            print("found " + c.name)
-            res.add(c.level)
-        return res
+    def _symbol_operands(self):
+        return [self.symbol]
 
 
 # EXPRESSIONS
 class Expr(IRNode):
+    __slots__ = ('destination_register',)
+
     def __init__(self, parent=None, children=None, symtab=None, destination_register=None):
         super(Expr, self).__init__(parent, children, symtab)
         self.destination_register = destination_register
@@ -520,6 +679,8 @@ class Expr(IRNode):
 
 
 class BinExpr(Expr):
+    __slots__ = ()
+
     # to lower this we have to translate it with
     # assembly code
     # var -> load statement LoadStatMIPS (symbol, sp/fp, dest -> [a register]) we have an infinite number
@@ -559,19 +720,21 @@ class BinExpr(Expr):
             elif isinstance(self.children[1], Const):
                 parameter1 = self.children[1]
             elif isinstance(self.children[1], BinExpr):
-                debug("now inspecting : " + str(type(self.children[1])))
+                if tracer.ir >= DEBUG:
+                    tracer.event('ir', 'lower_operand', node=type(self.children[1]))
                 parameter1 = self.children[1].get_destination_register()
                 self.children[1].lower()
                 statement_list.append(self.children[1])
             else:
-                debug("Unrecognized token in the expression")
+                debug("Unrecognized token in the expression", 'ir')
             if isinstance(self.children[2], Var):
                 parameter2 = Register(None, standard_types['register'](), self.symtab)
                 statement_list.append(LoadStatMIPS(parameter2, None, self.children[2], self.symtab))
             elif isinstance(self.children[2], Const):
                 parameter2 = self.children[2]
             elif isinstance(self.children[2], BinExpr):
-                debug("now inspecting : " + str(type(self.children[2])))
+                if tracer.ir >= DEBUG:
+                    tracer.event('ir', 'lower_operand', node=type(self.children[2]))
                 parameter2 = self.children[2].get_destination_register()
                 self.children[2].lower()
                 statement_list.append(self.children[2])
@@ -582,8 +745,7 @@ class BinExpr(Expr):
             statement_list.append(lowered_expression)
             # debug("starting replacing now " + str(self) + " with " + statement_list)
         except Exception as e:
-            debug("raising an exception in lowering")
-            print e
+            debug("raising an exception in lowering: " + str(e), 'ir')
         return self.parent.replace(self, StatList(self.parent, statement_list, self.symtab))
 
 
@@ -620,6 +782,8 @@ class BinExpr(Expr):
         return (res, newBinExpr)
 
 class UnExpr(Expr):
+    __slots__ = ()
+
     def getOperand(self):
         return self.children[1]
 
@@ -655,6 +819,8 @@ class UnExpr(Expr):
 
 
 class CallExpr(Expr):
+    __slots__ = ('symbol',)
+
     def __init__(self, parent=None, function=None, parameters=None, symtab=None):
         self.parent = parent
         self.symbol = function
@@ -742,7 +908,7 @@ class CallExpr(Expr):
         """
         
         res += "# call the function\n"
-        res += "\tjal " + self.symbol.name + "_" + str(id(self.symbol))
+        res += "\tjal " + procedure_label(self.symbol)
         res += "# Restore environment\n"
 
 
@@ -759,6 +925,8 @@ class CallExpr(Expr):
         
 # STATEMENTS
 class Stat(IRNode):
+    __slots__ = ('label',)
+
     def setLabel(self, label):
         self.label = label
         label.value = self  # set target
@@ -786,11 +954,14 @@ class Stat(IRNode):
 
 class CallStat(Stat):
     '''Procedure call (non returning)'''
+    __slots__ = ('call',)
+    node_fields = ('call',)
+
 
     def __init__(self, parent=None, call_expr=None, symtab=None):
         self.parent = parent
         self.call = call_expr
-        self.call.parent = self
+        self.adopt(self.call, 'call')
         self.symtab = symtab
 
     def get_function_call_uses(self):
@@ -850,6 +1021,8 @@ class CallStat(Stat):
 
 
 class NopStat(IRNode):
+    __slots__ = ('name',)
+
     def __init(self):
         self.name = None
 
@@ -873,15 +1046,18 @@ class NopStat(IRNode):
 
 
 class IfStat(Stat):
+    __slots__ = ('cond', 'thenpart', 'elsepart')
+    node_fields = ('cond', 'thenpart', 'elsepart')
+
     def __init__(self, parent=None, cond=None, thenpart=None, elsepart=None, symtab=None):
         self.parent = parent
         self.cond = cond
         self.thenpart = thenpart
         self.elsepart = elsepart
-        self.cond.parent = self
-        self.thenpart.parent = self
+        self.adopt(self.cond, 'cond')
+        self.adopt(self.thenpart, 'thenpart')
         if self.elsepart:
-            self.elsepart.parent = self
+            self.adopt(self.elsepart, 'elsepart')
         self.symtab = symtab
 
     def lower(self):
@@ -897,7 +1073,7 @@ class IfStat(Stat):
             try:
                 branch_to_exit = BranchStat(None, None, exit_label, self.symtab)
             except Exception as e:
-                print e
+                debug(str(e), 'ir')
             # the statement list has the following elements:
             # - branch_to_then
             # - else_part
@@ -917,17 +1093,20 @@ class IfStat(Stat):
 
     def collect_uses(self):
         # FIXME: missing collect_uses for the algorithm for the CFG
-        debug("calling collect_uses on the if_stmt node, this should not happen")
+        debug("calling collect_uses on the if_stmt node, this should not happen", 'ir')
         return self.thenpart.collect_uses() + self.elsepart.collect_uses()
 
 
 class WhileStat(Stat):
+    __slots__ = ('cond', 'body')
+    node_fields = ('cond', 'body')
+
     def __init__(self, parent=None, cond=None, body=None, symtab=None):
         self.parent = parent
         self.cond = cond
         self.body = body
-        self.cond.parent = self
-        self.body.parent = self
+        self.adopt(self.cond, 'cond')
+        self.adopt(self.body, 'body')
         self.symtab = symtab
 
     def lower(self):
@@ -950,25 +1129,31 @@ class WhileStat(Stat):
 
 
 class ForStat(Stat):
+    __slots__ = ('init', 'cond', 'step', 'body')
+    node_fields = ('init', 'cond', 'step', 'body')
+
     def __init__(self, parent=None, init=None, cond=None, step=None, body=None, symtab=None):
         self.parent = parent
         self.init = init
         self.cond = cond
         self.step = step
         self.body = body
-        self.cond.parent = self
-        self.body.parent = self
+        self.adopt(self.cond, 'cond')
+        self.adopt(self.body, 'body')
         self.target.parent = self
-        self.step.parent = self
+        self.adopt(self.step, 'step')
         self.symtab = symtab
 
 
 class AssignStat(Stat):
+    __slots__ = ('symbol', 'expr', 'local_symtab')
+    node_fields = ('expr',)
+
     def __init__(self, parent=None, target=None, expr=None, symtab=None):
         self.parent = parent
         self.symbol = target
         self.expr = expr
-        self.expr.parent = self
+        self.adopt(self.expr, 'expr')
         self.local_symtab = symtab
         self.symtab = self.local_symtab
 
@@ -1148,7 +1333,6 @@ class AssignStat(Stat):
                     if expr.children[0] == 'leq':
                         instr += "addi " + "$4" +" " +"$7" + ", 1"
                         instr += "\n\t"
-                        print("############ " + self.symbol.name  + str(self.symbol.address[fsym]))
                         instr += "slt $" + str(self.symbol.address[fsym]) +", $" +str(expr.children[1].symbol.address[fsym]) +", $4"
                     if expr.children[0] == 'gtr':
                         instr += "slt $" + str(self.symbol.address[fsym]) +", " +"$7" +", $" +str(expr.children[1].symbol.address[fsym]) 
@@ -1163,19 +1347,8 @@ class AssignStat(Stat):
 
 
 
-    def _get_symbol_level(self):
-        res = set()
-
-        for c in [self.symbol, self.expr]:
-            # if is a symbol and not a function call and not a constant
-            if isinstance(c, Symbol) and \
-               not isinstance(c.stype, FunctionType) and\
-               c.value is None :
-                print("found " + c.name)
-                res.add(c.level)
-            elif isinstance(c, IRNode):
-                res.update(c._get_symbol_level())
-        return res
+    def _symbol_operands(self):
+        return [self.symbol, self.expr]
 
 
 
@@ -1210,6 +1383,8 @@ class AssignStat(Stat):
         return SSA_list
 
 class BranchStat(Stat):
+    __slots__ = ('cond_var', 'on_true', 'on_false')
+
     def __init__(self, cond_var, on_true=None, on_false=None, symtab=None, parent=None):
         self.parent = parent
         self.cond_var = cond_var
@@ -1257,13 +1432,15 @@ class BranchStat(Stat):
 
 
 class EmptyStat(Stat):
-    pass
+    __slots__ = ()
 
     def collect_uses(self):
         return []
 
 
 class StoreStatMIPS(Stat):
+    __slots__ = ('store_symbol', 'offset', 'symbol', 'store_value')
+
     def __init__(self, parent=None, symbol=None, symtab=None, value=None, offset=0):
         self.parent = parent
         self.store_symbol = symbol
@@ -1281,8 +1458,9 @@ class StoreStatMIPS(Stat):
             self.children = [self.store_symbol, self.store_value]
         else:
             self.children = [Var(self, self.store_symbol, self.symtab), self.store_value]
-        self.store_symbol.parent = self
-        self.store_value.parent = self
+        # the stored symbol is wrapped in a Var, unless it is a register
+        self.adopt(self.children[0], 0)
+        self.adopt(self.store_value, 1)
 
     def collect_uses(self):
         return [self.store_symbol]
@@ -1297,6 +1475,8 @@ class StoreStatMIPS(Stat):
 
 
 class BinStat(Stat):
+    __slots__ = ()
+
     def __init__(self, operation, operand_1, operand_2, destination, parent=None, symtab=None):
         self.children = [operation, operand_1, operand_2, destination]
         self.parent = parent
@@ -1310,6 +1490,8 @@ class BinStat(Stat):
 
 
 class StoreStat(Stat):
+    __slots__ = ('to_load', 'fsym')
+
     def __init__(self, variables, parent=None, symtab=None):
         
         if variables is None:
@@ -1365,6 +1547,8 @@ class StoreStat(Stat):
 
 
 class LoadStat(Stat):
+    __slots__ = ('to_load', 'fsym')
+
     def __init__(self, variables, parent=None, symtab=None):
         
         if variables is None:
@@ -1421,6 +1605,8 @@ class LoadStat(Stat):
 
 
 class LoadStatMIPS(Stat):
+    __slots__ = ('offset', 'symbol')
+
     def __init__(self, register=None, parent=None, symbol=None, symtab=None, offset=0):
         self.offset = offset
         self.parent = parent
@@ -1449,12 +1635,14 @@ class LoadStatMIPS(Stat):
 
 
 class StatList(Stat):
+    __slots__ = ()
+
     def __init__(self, parent=None, children=None, symtab=None):
         self.parent = parent
         if children:
             self.children = children[:]
-            for c in self.children:
-                c.parent = self
+            for i, c in enumerate(self.children):
+                self.adopt(c, i)
         else:
             self.children = []
         self.symtab = symtab
@@ -1469,7 +1657,7 @@ class StatList(Stat):
         return call_uses
 
     def append(self, elem):
-        elem.parent = self
+        self.adopt(elem, len(self.children))
         self.children.append(elem)
 
     def collect_uses(self):
@@ -1488,7 +1676,8 @@ class StatList(Stat):
     def flatten(self):
         '''Remove nested StatLists'''
         if type(self.parent) == StatList:
-            print 'Flattening', id(self), 'into', id(self.parent)
+            if tracer.ir >= DEBUG:
+                tracer.event('ir', 'flatten', node=id(self), into=id(self.parent))
             for c in self.children:
                 c.parent = self.parent
             try:
@@ -1496,33 +1685,41 @@ class StatList(Stat):
                 self.children[0].setLabel(label)
             except Exception:
                 pass
-            i = self.parent.children.index(self)
+            i = self.parent.slot_of(self)
             self.parent.children = self.parent.children[:i] + self.children + self.parent.children[i + 1:]
+            # the children of self and the ones after them moved
+            self.parent.reindex(i)
             return True
         else:
-            print 'Not flattening', id(self), 'into', id(self.parent), 'of type', type(self.parent)
+            if tracer.ir >= DEBUG:
+                tracer.event('ir', 'not_flattened', node=id(self), parent=type(self.parent))
             return False
 
     def lower(self):
         for i in range(len(self.children)):
-            if 'lower' in dir(self.children):
+            if hasattr(self.children, 'lower'):
                 self.children[i].lower()
 
 
 class Block(Stat):
+    __slots__ = ('global_symtab', 'local_symtab', 'body', 'defs')
+    node_fields = ('defs', 'body')
+
     def __init__(self, parent=None, gl_sym=None, lc_sym=None, defs=None, body=None):
         self.parent = parent
         self.global_symtab = gl_sym
         self.local_symtab = lc_sym
         self.body = body
         self.defs = defs
-        self.body.parent = self
-        self.defs.parent = self
+        self.adopt(self.body, 'body')
+        self.adopt(self.defs, 'defs')
 
     def get_function_call_uses(self):
         return self.body.get_function_call_uses()
 
 class PrintStat(Stat):
+    __slots__ = ('symbol',)
+
     def __init__(self, parent=None, symbol=None, symtab=None):
         self.parent = parent
         self.symbol = symbol
@@ -1561,6 +1758,8 @@ class PrintStat(Stat):
         return "print " + self.symbol.instr_dot_repr() 
 
 class InputStat(Stat):
+    __slots__ = ('symbol', 'local_symtab')
+
     def __init__(self, parent=None, symbol=None, symtab=None):
         self.parent = parent
         self.symbol = symbol
@@ -1595,12 +1794,17 @@ class InputStat(Stat):
 
 # DEFINITIONS
 class Definition(IRNode):
+    __slots__ = ('symbol',)
+
     def __init__(self, parent=None, symbol=None):
         self.parent = parent
         self.symbol = symbol
 
 
 class FunctionDef(Definition):
+    __slots__ = ('body', 'function_label')
+    node_fields = ('body',)
+
     def __init__(self, parent=None, symbol=None, body=None):
         self.parent = parent
         self.symbol = symbol
@@ -1608,7 +1812,7 @@ class FunctionDef(Definition):
         self.function_label = standard_types['label']()
         # add the pair name/label to the function_labels dictionary
         function_labels[self.symbol.name] = self.function_label
-        self.body.parent = self
+        self.adopt(self.body, 'body')
 
     def get_name(self):
         return self.symbol.name
@@ -1634,9 +1838,12 @@ class FunctionDef(Definition):
         # add branch to return address
         statement_list.append(br)
         statement_list.children.insert(0, empty)
+        statement_list.reindex()
 
 
 class DefinitionList(IRNode):
+    __slots__ = ()
+
     def __init__(self, parent=None, children=None):
         self.parent = parent
         if children:
@@ -1645,7 +1852,7 @@ class DefinitionList(IRNode):
             self.children = []
 
     def append(self, elem):
-        elem.parent = self
+        self.adopt(elem, len(self.children))
         self.children.append(elem)
 
 
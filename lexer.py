@@ -3,6 +3,8 @@
 # documentation of the file
 __doc__='''Simple lexer for PL/0 using generators'''
 
+import re
+
 # PL/0 is a very simple procedural language
 # it has some pascal-like feature
 
@@ -42,11 +44,14 @@ symbols =  {
 	'input'		: ['?', 'input'],
 }
 
+# Reverse lookup table: spelling -> token
+reverse_symbols = dict((word, s) for s in symbols for word in symbols[s])
+
+
 def token(word):
 	'''Return corresponding token for a given word'''
-	for s in symbols : 
-		if word in symbols[s] :
-			return s
+	if word in reverse_symbols :
+		return reverse_symbols[word]
 	try : # If a terminal is not one of the standard tokens but can be converted to float, then it is a number,
 		# otherwise, an identifier
 		float(word)
@@ -55,18 +60,94 @@ def token(word):
 	except ValueError, e :
 		return 'ident'
 
+
+def _master_pattern():
+	'''Build the single regex used to scan a program'''
+	# operators are tried longest first, so that ':=' wins over ':'
+	operators = sorted([w for w in reverse_symbols if not re.match('\w', w)], key=len, reverse=True)
+	alternatives = '|'.join([re.escape(op) for op in operators])
+	# words, known operators, any other single non-blank character
+	return re.compile(r'\w+|' + alternatives + r'|[^\w\s]')
+
+
+master_pattern = _master_pattern()
+
+
 def lexer(text):
 	"""Generator implementation of a lexer"""
 
 	# Generator: it keeps a state between different invocations
-	#   		it recieves the whole program and splits it
-	import re
-	from string import split, strip, lower, join
-	t = re.split('(\W+)', text)  # Split at non alphanumeric sequences
-	text = join(t ,' ')  # Join alphanumeric and non-alphanumeric, with spaces
-	words = [strip(w) for w in split(lower(text))]  # Split tokens (make it lowercase)
-	for word in words:
-		yield token(word), word    # we return the token and the value/word
+	#   		it scans the whole program once with the master pattern
+	table = dict(reverse_symbols)
+	for match in master_pattern.finditer(text):
+		word = match.group().lower()
+		tok = table.get(word)
+		if tok is None:
+			# numbers and identifiers are classified once per distinct word
+			tok = table[word] = token(word)
+		yield tok, word    # we return the token and the value/word
+
+
+# Source positions are packed in a single integer:
+# column in the lowest bits, then line, then the byte offset
+COLUMN_BITS = 20
+LINE_BITS = 24
+_COLUMN_MASK = (1 << COLUMN_BITS) - 1
+_LINE_MASK = (1 << LINE_BITS) - 1
+
+
+def pack_position(offset, line, column):
+	'''Pack offset, line and column in one integer (line and column saturate)'''
+	return (offset << (LINE_BITS + COLUMN_BITS)) | (min(line, _LINE_MASK) << COLUMN_BITS) | min(column, _COLUMN_MASK)
+
+
+def unpack_position(position):
+	'''Return the (offset, line, column) triple of a packed position'''
+	return position >> (LINE_BITS + COLUMN_BITS), (position >> COLUMN_BITS) & _LINE_MASK, position & _COLUMN_MASK
+
+
+def format_position(position):
+	offset, line, column = unpack_position(position)
+	return 'line ' + str(line) + ', column ' + str(column)
+
+
+# same as the master pattern, but newlines are matched to keep track of lines
+stream_pattern = re.compile(r'(\n)|' + master_pattern.pattern)
+
+
+def positioned_lexer(source):
+	"""Generator lexer yielding (token, word, position) triples, see pack_position
+	The source can be a string or any buffer, such as a memory-mapped file"""
+	table = dict(reverse_symbols)
+	line = 1
+	line_start = 0
+	for match in stream_pattern.finditer(source):
+		start = match.start()
+		if match.lastindex:
+			line += 1
+			line_start = start + 1
+			continue
+		word = match.group().lower()
+		tok = table.get(word)
+		if tok is None:
+			tok = table[word] = token(word)
+		yield tok, word, pack_position(start, line, start - line_start + 1)
+
+
+def stream_lexer(filename):
+	"""Generator lexer over a memory-mapped source file
+	Yields (token, word, position) triples, see pack_position"""
+	import mmap
+	with open(filename, 'rb') as fin:
+		try:
+			source = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+		except ValueError:  # empty files cannot be mapped
+			return
+		try:
+			for tok in positioned_lexer(source):
+				yield tok
+		finally:
+			source.close()
 
 
 # Test support
@@ -139,5 +220,10 @@ __test_program1 = '''
 	'''
 
 if __name__ == '__main__' :
-	for t,w in lexer(__test_program):
-		print t, w
+	import sys
+	if len(sys.argv) > 1:
+		for t, w, p in stream_lexer(sys.argv[1]):
+			print format_position(p), t, w
+	else:
+		for t,w in lexer(__test_program):
+			print t, w
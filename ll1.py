@@ -0,0 +1,244 @@
+#!/usr/bin/python
+
+__doc__ = '''Table-driven LL(1) parsing
+A grammar is a text of rules ended by a dot, alternatives separated by bars:
+
+    expression = $minus term @unary more_terms | term more_terms .
+    term       = factor more_factors .
+
+Every name that has a rule is a nonterminal, any other name is a terminal (a
+token name); $name is a terminal whose value is pushed on the value stack when
+it is matched, @name is a semantic action, called with the parser and the value
+stack. An alternative can be empty. "eof" stands for the end of the tokens.
+The FIRST and FOLLOW sets are computed once and turned into a table indexed by
+nonterminal and integer token kind. The only conflicts accepted are between an
+alternative that derives the empty string and one that starts with the token
+(the dangling else): the latter wins, any other conflict is a GrammarError.'''
+
+import re
+
+# encoding of the symbols of the productions:
+# terminals are their token kinds, valued terminals are offset by VALUED,
+# nonterminals by NONTERMINAL, actions are functions
+VALUED = 256
+NONTERMINAL = 512
+
+EOF = 'eof'
+
+
+class GrammarError(Exception):
+    pass
+
+
+class ParseError(Exception):
+    '''The token at index does not match, expected holds the acceptable token names'''
+
+    def __init__(self, index, expected):
+        super(ParseError, self).__init__("expected " + " or ".join(expected))
+        self.index = index
+        self.expected = expected
+
+
+class Grammar(object):
+    def __init__(self, text, terminals, words=('ident', 'number')):
+        '''text      -- the rules, the first one is the axiom
+        terminals -- token names in order of kind, eof is added after them
+        words     -- valued terminals that push their word (the others push their name)'''
+        self.terminals = list(terminals) + [EOF]
+        self.kinds = dict((name, kind) for kind, name in enumerate(self.terminals))
+        self.words = frozenset(words)
+        self.rules = []
+        self.alternatives = dict()
+        self.read(text)
+
+        self.nullable = set()
+        self.first = dict((name, set()) for name in self.alternatives)
+        self.follow = dict((name, set()) for name in self.alternatives)
+        self.compute_first()
+        self.compute_follow()
+
+    def read(self, text):
+        text = re.sub(r'#[^\n]*', '', text)
+        # a rule ends with a dot standing alone
+        for rule in re.split(r'\s\.(?=\s|$)', text):
+            if not rule.strip():
+                continue
+            name, equal, body = rule.partition('=')
+            name = name.strip()
+            if not equal or not re.match(r'^\w+$', name):
+                raise GrammarError("malformed rule: " + rule.strip())
+            if name in self.alternatives:
+                raise GrammarError("rule " + name + " defined twice")
+            self.rules.append(name)
+            self.alternatives[name] = [alternative.split() for alternative in body.split('|')]
+
+        for name in self.rules:
+            for alternative in self.alternatives[name]:
+                for symbol in alternative:
+                    if symbol[0] == '@':
+                        continue
+                    if symbol[0] == '$':
+                        if symbol[1:] not in self.kinds:
+                            raise GrammarError("valued symbol " + symbol + " is not a token, in rule " + name)
+                    elif symbol not in self.alternatives and symbol not in self.kinds:
+                        raise GrammarError("unknown token " + symbol + " in rule " + name)
+
+    def first_of(self, symbols):
+        '''FIRST set of a sequence of symbols, and whether it derives the empty string'''
+        res = set()
+        for symbol in symbols:
+            if symbol[0] == '@':
+                continue
+            symbol = symbol.lstrip('$')
+            if symbol not in self.alternatives:
+                res.add(symbol)
+                return res, False
+            res |= self.first[symbol]
+            if symbol not in self.nullable:
+                return res, False
+        return res, True
+
+    def compute_first(self):
+        changed = True
+        while changed:
+            changed = False
+            for name in self.rules:
+                for alternative in self.alternatives[name]:
+                    first, nullable = self.first_of(alternative)
+                    if not first <= self.first[name]:
+                        self.first[name] |= first
+                        changed = True
+                    if nullable and name not in self.nullable:
+                        self.nullable.add(name)
+                        changed = True
+
+    def compute_follow(self):
+        changed = True
+        while changed:
+            changed = False
+            for name in self.rules:
+                for alternative in self.alternatives[name]:
+                    for i, symbol in enumerate(alternative):
+                        if symbol not in self.alternatives:
+                            continue
+                        first, nullable = self.first_of(alternative[i + 1:])
+                        if nullable:
+                            first |= self.follow[name]
+                        if not first <= self.follow[symbol]:
+                            self.follow[symbol] |= first
+                            changed = True
+
+    def table(self, actions):
+        '''Build the parsing table, actions maps the action names to functions'''
+        return ParsingTable(self, actions)
+
+
+class ParsingTable(object):
+    def __init__(self, grammar, actions):
+        self.grammar = grammar
+        self.names = grammar.terminals
+        self.eof = grammar.kinds[EOF]
+        self.words = [name in grammar.words for name in self.names]
+        number = dict((name, i) for i, name in enumerate(grammar.rules))
+        self.start = NONTERMINAL + number[grammar.rules[0]]
+
+        def encode(symbol):
+            if symbol[0] == '@':
+                try:
+                    return actions[symbol[1:]]
+                except KeyError:
+                    raise GrammarError("no semantic action " + symbol[1:])
+            if symbol[0] == '$':
+                return VALUED + grammar.kinds[symbol[1:]]
+            if symbol in number:
+                return NONTERMINAL + number[symbol]
+            return grammar.kinds[symbol]
+
+        # rows[nonterminal][kind] is the production to expand, reversed for the stack
+        self.rows = []
+        for name in grammar.rules:
+            row = [None] * len(self.names)
+            chosen = [None] * len(self.names)
+            for alternative in grammar.alternatives[name]:
+                first, nullable = grammar.first_of(alternative)
+                production = tuple(encode(symbol) for symbol in reversed(alternative))
+                lookaheads = [(t, False) for t in first]
+                if nullable:
+                    lookaheads += [(t, True) for t in grammar.follow[name]]
+                for terminal, by_follow in lookaheads:
+                    kind = grammar.kinds[terminal]
+                    if row[kind] is None:
+                        row[kind], chosen[kind] = production, by_follow
+                    elif chosen[kind] and not by_follow:
+                        # the alternative starting with the token wins over the empty one
+                        row[kind], chosen[kind] = production, by_follow
+                    elif not (by_follow and not chosen[kind]):
+                        raise GrammarError("LL(1) conflict in rule " + name + " on " + terminal)
+            self.rows.append(row)
+
+        # the nonterminals on top of a production expand on the same token:
+        # the leftmost derivation down to the token is done once, here
+        self.rows = [[None if production is None else self.expand(production, kind)
+                      for kind, production in enumerate(row)] for row in self.rows]
+
+    def expand(self, production, kind):
+        '''Production with the nonterminals above its first terminal expanded for the token kind'''
+        res = list(production)
+        top = len(res) - 1
+        while top >= 0:
+            symbol = res[top]
+            if type(symbol) is not int:
+                # actions consume no token, the expansion goes on below them
+                top -= 1
+            elif symbol >= NONTERMINAL:
+                below = self.rows[symbol - NONTERMINAL][kind]
+                if below is None:
+                    break
+                res[top:top + 1] = below
+                top += len(below) - 1
+            else:
+                break
+        return tuple(res)
+
+    def expected(self, symbol):
+        '''Names of the tokens acceptable where symbol is expected'''
+        if symbol >= NONTERMINAL:
+            row = self.rows[symbol - NONTERMINAL]
+            return sorted(self.names[kind] for kind, production in enumerate(row) if production is not None)
+        return [self.names[symbol % VALUED]]
+
+    def parse(self, kinds, values, context):
+        '''Parse the tokens given by their kinds and values, return the value stack
+        The actions are called as action(context, stack); a ParseError is raised
+        at the first token that does not fit the grammar.'''
+        rows = self.rows
+        words = self.words
+        names = self.names
+        eof = self.eof
+        count = len(kinds)
+
+        out = []
+        stack = [self.start]
+        pop = stack.pop
+        extend = stack.extend
+        index = 0
+        kind = kinds[0] if count else eof
+        while stack:
+            top = pop()
+            if type(top) is not int:
+                top(context, out)
+            elif top >= NONTERMINAL:
+                production = rows[top - NONTERMINAL][kind]
+                if production is None:
+                    raise ParseError(index, self.expected(top))
+                extend(production)
+            else:
+                if top >= VALUED:
+                    top -= VALUED
+                    if top == kind:
+                        out.append(values[index] if words[kind] else names[kind])
+                if top != kind:
+                    raise ParseError(index, self.expected(top))
+                index += 1
+                kind = kinds[index] if index < count else eof
+        return out
@@ -0,0 +1,160 @@
+#!/usr/bin/python
+
+__doc__ = '''Per-phase instrumentation of the compilation pipeline
+A phase starts with start() and ends when the next one starts (or at stop()):
+its wall and CPU time are recorded with the counters set while it runs.
+The pipeline receives a NullReport when nothing is measured, and computes the
+counters only when report.enabled is set.
+With memory, every phase also records the resident set size at its end, the
+high-water mark of the resident set size during the phase, the one of the
+whole process, and (unless census is False) the census of the live objects
+of the compiler classes at its end.
+The high-water mark of a phase is the VmHWM of the process, reset when the
+phase starts; where it cannot be reset (kernels before Linux 4.0, no /proc)
+the phase reports the peak of the process and peak_scope says so.
+Python 2 has no allocation tracer: the sizes are the ones of sys.getsizeof on
+the objects and on their attribute dictionaries.'''
+
+import gc
+import json
+import os
+import resource
+import sys
+import time
+
+# modules whose classes are counted by the census
+CENSUS_MODULES = frozenset(['ir', 'cfg', 'call_graph', 'register_alloc', 'frontend', 'tokenbuffer'])
+
+
+class PhaseReport(object):
+    enabled = True
+
+    def __init__(self, source=None, memory=False, census=True):
+        self.source = source
+        self.memory = memory
+        self.census = census
+        self.phases = []
+        self.current = None
+
+    def start(self, name):
+        self.stop()
+        self.current = dict(name=name, counters=dict())
+        if self.memory:
+            self.peak_reset = reset_peak()
+        self.wall = time.time()
+        self.cpu = time.clock()
+
+    def stop(self):
+        if self.current is None:
+            return
+        self.current['wall_seconds'] = time.time() - self.wall
+        self.current['cpu_seconds'] = time.clock() - self.cpu
+        if self.memory:
+            self.current['memory'] = memory_snapshot(self.census, self.peak_reset)
+        self.phases.append(self.current)
+        self.current = None
+
+    def count(self, counter, value):
+        '''Set a counter of the running phase, or of the last one if stopped
+        (counters that are expensive to compute stop the phase first)'''
+        (self.current or self.phases[-1])['counters'][counter] = value
+
+    def as_dict(self):
+        self.stop()
+        return dict(
+            source=self.source,
+            wall_seconds=sum(p['wall_seconds'] for p in self.phases),
+            cpu_seconds=sum(p['cpu_seconds'] for p in self.phases),
+            phases=self.phases,
+        )
+
+    def write(self, filename):
+        with open(filename, "w") as fout:
+            json.dump(self.as_dict(), fout, indent=2)
+
+
+class NullReport(object):
+    '''Measures nothing'''
+    enabled = False
+
+    def start(self, name):
+        pass
+
+    def stop(self):
+        pass
+
+    def count(self, counter, value):
+        pass
+
+
+def resident_kb():
+    '''Current resident set size, None where /proc is not available'''
+    try:
+        with open('/proc/self/statm') as fin:
+            return int(fin.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def reset_peak():
+    '''Reset the high-water mark of the resident set size of the process,
+    False where the kernel does not allow it'''
+    try:
+        with open('/proc/self/clear_refs', 'w') as fout:
+            fout.write('5')
+        return True
+    except (IOError, OSError):
+        return False
+
+
+def peak_kb():
+    '''High-water mark of the resident set size since the last reset'''
+    try:
+        with open('/proc/self/status') as fin:
+            for line in fin:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except (IOError, OSError, ValueError):
+        pass
+    return None
+
+
+def census():
+    '''Number and size in bytes of the live objects of every compiler class'''
+    classes = dict()
+    for obj in gc.get_objects():
+        cls = type(obj)
+        if getattr(cls, '__module__', None) not in CENSUS_MODULES:
+            continue
+        size = sys.getsizeof(obj)
+        attributes = getattr(obj, '__dict__', None)
+        if attributes is not None:
+            size += sys.getsizeof(attributes)
+        count, total = classes.get(cls.__name__, (0, 0))
+        classes[cls.__name__] = (count + 1, total + size)
+    return dict((name, dict(count=count, bytes=total)) for name, (count, total) in classes.items())
+
+
+def memory_snapshot(with_census=True, peak_reset=False):
+    '''peak_reset tells whether the high-water mark was reset at the start of the phase'''
+    # ru_maxrss is in kilobytes on Linux
+    process_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    phase_peak = peak_kb() if peak_reset else None
+    # the kernel updates ru_maxrss lazily, it may lag behind VmHWM
+    if phase_peak is not None:
+        process_peak = max(process_peak, phase_peak)
+    snapshot = dict(rss_kb=resident_kb(), process_peak_rss_kb=process_peak)
+    if phase_peak is not None:
+        snapshot.update(peak_rss_kb=phase_peak, peak_scope='phase')
+    else:
+        snapshot.update(peak_rss_kb=process_peak, peak_scope='process')
+    if with_census:
+        snapshot['objects'] = census()
+    return snapshot
+
+
+def count_nodes(root):
+    '''Number of distinct nodes reachable from the root of the IR'''
+    seen = set()
+    root.navigate(lambda node: seen.add(id(node)))
+    return len(seen)
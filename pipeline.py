@@ -0,0 +1,279 @@
+#!/usr/bin/python
+
+__doc__ = '''Compilation pipeline
+Runs every phase from the IR tree to the MIPS assembly, without user interaction
+unless pauses or visualisations are explicitly requested.'''
+
+from frontend import PARSERS
+from lexer import positioned_lexer, stream_lexer
+from tokenbuffer import TokenBuffer
+from ir import SymbolTable, procedure_label
+from support import debug, print_dotty, constant_propagation, constant_folding
+from logger import tracer
+from cfg import CFG
+from call_graph import CallGraph
+from datalayout import data_layout
+from register_alloc import RegisterAllocator
+from incremental import procedure_fingerprint
+from metrics import NullReport, count_nodes
+
+# part of the cache keys, to be bumped whenever the generated code changes
+COMPILER_VERSION = '0.5'
+
+# optional optimization passes on the IR tree, in order
+PASSES = ('constant_propagation', 'constant_folding')
+
+# default parsing mode, see frontend.PARSERS
+PARSING = 'table'
+
+
+class CompilationError(Exception):
+    '''The source program cannot be compiled, errors holds the diagnostics'''
+
+    def __init__(self, errors):
+        super(CompilationError, self).__init__("\n".join(errors))
+        self.errors = errors
+
+
+def banner(title):
+    debug("#######################################")
+    debug(title.center(39, "#"))
+    debug("#######################################")
+
+
+def compile_tokens(tokens, output=None, show=False, pause=False, dot_file=None, passes=PASSES, artifacts=None,
+                   procedures=None, report=None, parsing=PARSING):
+    '''Compile a token buffer, return the assembly text
+    output    -- file where the assembly is written (None to only return it)
+    show      -- render and open every Graphviz diagram
+    pause     -- wait for the user between the phases
+    dot_file  -- file where the dot representation of the IR is written
+    passes    -- enabled optimization passes, see PASSES
+    artifacts -- if a dictionary, it receives the intermediate results
+                 ('ir', 'symtab', 'cfg', 'call_graph', 'data_layout', 'recompiled')
+    procedures -- a cache.CompilationCache of the code of single procedures: only
+                  the procedures whose fingerprint is not in it are compiled
+    report    -- a metrics.PhaseReport receiving the time and the counters of each phase
+    parsing   -- 'table' (LL(1) table), 'recursive' (recursive descent) or 'iterative', see frontend.PARSERS'''
+
+    def wait():
+        if pause:
+            raw_input("Press any key to continue...")
+
+    if report is None:
+        report = NullReport()
+
+    banner(" FRONTEND ")
+
+    # Build the syntactic tree/IR tree
+    report.start('frontend')
+    parser = PARSERS[parsing](tokens)
+    res = parser.program()
+    if parser.errors:
+        report.stop()
+        raise CompilationError(parser.errors)
+    if report.enabled:
+        report.stop()
+        report.count('ir_nodes', count_nodes(res))
+
+    if dot_file:
+        print_dotty(res, dot_file, view=show)
+        wait()
+
+    if 'constant_propagation' in passes:
+        report.start('constant_propagation')
+        res.navigate(constant_propagation)
+    if 'constant_folding' in passes:
+        report.start('constant_folding')
+        res.navigate_postvisit(constant_folding)
+        if report.enabled:
+            report.stop()
+            report.count('ir_nodes', count_nodes(res))
+
+    if dot_file:
+        print_dotty(res, dot_file, view=show)
+    wait()
+
+    # the whole symbol table
+    # as a tree structure
+    report.start('symbol_table')
+    symtab = SymbolTable(res)
+    if report.enabled:
+        report.count('procedures', len(symtab.symtab_dict))
+        report.count('symbols', sum(len(t) for t in symtab.symtab_dict.values()))
+
+    if show:
+        symtab.show_graphviz()
+    wait()
+
+    banner(" CONTROL FLOW GRAPH ")
+    # build the CFG from the IR
+    report.start('cfg')
+    cfg = CFG(res)
+    if report.enabled:
+        report.count('basic_blocks', sum(len(l) for l in cfg.BB_list.values()))
+        temporaries = sum(t.temp_counter for t in symtab.symtab_dict.values())
+        report.count('temporaries', temporaries)
+
+    # show the CFG for each
+    # function
+    if show:
+        cfg.graphviz()
+    wait()
+
+    banner(" CALL GRAPH ")
+
+    report.start('call_graph')
+    call_graph = CallGraph(cfg, symtab, show_before=show)
+    report.count('fixed_point_iterations', call_graph.iterations)
+
+    if show:
+        call_graph.graphviz()
+    wait()
+
+    banner(" DATA LAYOUT ")
+
+    report.start('data_layout')
+    layout = data_layout(symtab, call_graph)
+    report.count('stack_slots', sum(len(stack) for stack in layout.values()))
+    wait()
+
+    # the procedures left to compile, all of them without a cache
+    functions = None
+    reuse = dict()
+    if procedures is not None:
+        report.start('fingerprints')
+        salt = COMPILER_VERSION + '\0' + ','.join(sorted(passes)) + '\0'
+        fingerprints = dict()
+        for fsym in cfg.cfgs:
+            fingerprints[fsym] = procedure_fingerprint(fsym, symtab, cfg, call_graph, salt)
+            code = procedures.get(fingerprints[fsym])
+            if code is not None:
+                reuse[fsym] = code
+        functions = set(cfg.cfgs) - set(reuse)
+        report.count('procedures_reused', len(reuse))
+        if tracer.driver:
+            tracer.event('driver', 'incremental', reused=len(reuse), compiled=len(functions))
+
+    # put the CFG into three_addr_form form
+    report.start('three_addr_form')
+    cfg.three_addr_form(functions)
+    if report.enabled:
+        report.count('temporaries', sum(t.temp_counter for t in symtab.symtab_dict.values()) - temporaries)
+
+    # show the CFG in three_addr_form for each
+    # function
+    if show:
+        cfg.graphviz()
+    wait()
+
+    banner(" LIVENESS GRAPH ")
+
+    report.start('liveness')
+    liveness_graphs = cfg.liveness_graphs(show=show, functions=functions)
+    if report.enabled:
+        report.count('fixed_point_iterations', sum(g.iterations for g in liveness_graphs.values()))
+        report.count('liveness_nodes', sum(len(g.node_list) for g in liveness_graphs.values()))
+
+    if show:
+        cfg.graphviz()
+    wait()
+
+    banner(" REGISTER ALLOCATION ")
+
+    report.start('register_allocation')
+    allocator = RegisterAllocator(liveness_graphs, cfg, show=show)
+    if report.enabled:
+        report.count('colours_used', max([g.colours_used() for g in allocator.color_graphs.values()] or [0]))
+    wait()
+
+    report.start('code_generation')
+    assembly = cfg.code_generation(output, reuse)
+    report.count('assembly_lines', assembly.count('\n'))
+    report.stop()
+
+    if procedures is not None:
+        for fsym in functions:
+            procedures.put(fingerprints[fsym], cfg.function_code[fsym], evict=False)
+        procedures.evict()
+
+    if artifacts is not None:
+        artifacts.update(ir=res, symtab=symtab, cfg=cfg, call_graph=call_graph, data_layout=layout,
+                         recompiled=sorted(procedure_label(f) for f in (cfg.cfgs if functions is None else functions)))
+
+    return assembly
+
+
+def write_output(output, assembly):
+    if output is not None:
+        with open(output, "w") as fout:
+            fout.write(assembly)
+
+
+def uncached(cache, options):
+    # interactive, visual and measured runs always go through the whole pipeline
+    return cache is None or options.get('show') or options.get('pause') or options.get('dot_file') or \
+        options.get('report')
+
+
+def compile_cached(key, compile, cache, output=None, artifacts=None, **options):
+    '''Look the key up in the cache, compile and store on a miss'''
+    assembly = cache.get(key)
+    if assembly is not None:
+        if artifacts is not None:
+            artifacts.update(cache.get_artifacts(key) or {})
+        write_output(output, assembly)
+        return assembly
+
+    results = dict() if artifacts is not None else None
+    assembly = compile(output, artifacts=results, **options)
+    if artifacts is not None:
+        # the IR tree and the symbol table are left out, the CFG refers to them
+        stored = dict((k, results[k]) for k in ('cfg', 'call_graph', 'data_layout'))
+        artifacts.update(stored, recompiled=results['recompiled'])
+        cache.put(key, assembly, stored)
+    else:
+        cache.put(key, assembly)
+    return assembly
+
+
+def lex(tokens, report=None):
+    '''Read the tokens in a TokenBuffer, as the first phase of the report'''
+    if report is not None:
+        report.start('lexer')
+    tokens = TokenBuffer(tokens)
+    if report is not None:
+        report.count('tokens', len(tokens))
+    return tokens
+
+
+def compile_file(filename, output=None, cache=None, incremental=False, **options):
+    '''Compile a source file, see compile_tokens for the options
+    With a cache (see cache.CompilationCache) unchanged programs are not recompiled;
+    on a hit, artifacts receives the cached intermediate results if they were stored.
+    With incremental, the cache also keeps the code of the single procedures.'''
+    if incremental and cache is not None:
+        options['procedures'] = cache
+
+    def compile(output, **options):
+        # tokens are read lazily from the memory-mapped file
+        return compile_tokens(lex(stream_lexer(filename), options.get('report')), output, **options)
+
+    if uncached(cache, options):
+        return compile(output, **options)
+    key = cache.key_for_file(filename, COMPILER_VERSION, options.get('passes', PASSES))
+    return compile_cached(key, compile, cache, output, **options)
+
+
+def compile_text(text, output=None, cache=None, incremental=False, **options):
+    '''Compile a program given as a string, see compile_file'''
+    if incremental and cache is not None:
+        options['procedures'] = cache
+
+    def compile(output, **options):
+        return compile_tokens(lex(positioned_lexer(text), options.get('report')), output, **options)
+
+    if uncached(cache, options):
+        return compile(output, **options)
+    key = cache.key(text, COMPILER_VERSION, options.get('passes', PASSES))
+    return compile_cached(key, compile, cache, output, **options)
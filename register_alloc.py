@@ -1,5 +1,6 @@
-from graphviz import Graph
+from visualisation import Graph
 from random import randint
+from logger import tracer, DEBUG
 
 
 # $0            $zero       Hard-wired to 0
@@ -68,7 +69,8 @@ class ColorNode:
     def set_color(self, color):
         self.color = color
         self.symbol.address[self.fsym] = color + 8
-        print("For "  + self.symbol.name + " the register is " + str(self.symbol.address[self.fsym]))
+        if tracer.regalloc >= DEBUG:
+            tracer.event('regalloc', 'assign', symbol=self.symbol.name, register=self.symbol.address[self.fsym])
 
 
 
@@ -113,6 +115,10 @@ class ColorGraph:
                     node.set_color(i)
                     break
 
+    def colours_used(self):
+        colours = [node.color for node in self.nodes.values() if node.color is not None]
+        return max(colours) + 1 if colours else 0
+
 
     def graphviz(self):
 
@@ -136,10 +142,11 @@ class ColorGraph:
 
 
 class RegisterAllocator:
-    def __init__(self, liveness_graphs, cfg):
+    def __init__(self, liveness_graphs, cfg, show=False):
         self.live_graphs = liveness_graphs
         self.cfg = cfg
         self.cfgs = cfg.cfgs
+        self.show = show
 
         self.color_graphs = dict()
 
@@ -148,10 +155,12 @@ class RegisterAllocator:
     def __assign_registers(self):
 
         for fsym, live_graph in self.live_graphs.items():
-            print("Assigning register to function: " + fsym.name)
+            if tracer.regalloc:
+                tracer.event('regalloc', 'function', function=fsym.name)
             self.__assign_registers_function(fsym, live_graph, self.cfgs[fsym])
 
     def __assign_registers_function(self, fsym, live_graph, cfg):
         
         self.color_graphs[fsym] = ColorGraph(fsym, live_graph)
-        self.color_graphs[fsym].graphviz()
\ No newline at end of file
+        if self.show:
+            self.color_graphs[fsym].graphviz()
\ No newline at end of file
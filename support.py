@@ -1,7 +1,7 @@
 #!/usr/bin/python
 
-from graphviz import Digraph
-from texttable import Texttable
+from visualisation import Digraph, Texttable, NullGraph
+from logger import tracer, INFO, DEBUG
 
 __doc__ = '''Support functions for visiting the AST
 These functions expose high level interfaces (passes) for actions that can be applied to multiple IR nodes.'''
@@ -11,8 +11,12 @@ def get_node_list(root):
     '''Get a list of all nodes in the AST'''
 
     def register_nodes(l):
+        # the nodes stay alive in the list, their ids are not reused
+        seen = set()
+
         def r(node):
-            if node not in l:
+            if id(node) not in seen:
+                seen.add(id(node))
                 l.append(node)
 
         return r
@@ -101,7 +105,8 @@ def constant_propagation(node):
     try:
         node.constant_propagation()
     except Exception, e:
-        print 'Cannot Perform Constat Prop', type(node), e
+        if tracer.ir:
+            tracer.event('ir', 'constant_propagation_failed', node=type(node), error=e)
         pass  # lowering not yet implemented for this class
 
 
@@ -168,7 +173,8 @@ def constant_folding(node):
             if isinstance(node.children[1], Const):
                 node.parent.replace(node, resolve_un_expr(node))
     except Exception, e:
-        print 'Cannot Perform Constat Folding', type(node), e
+        if tracer.ir:
+            tracer.event('ir', 'constant_folding_failed', node=type(node), error=e)
         pass  # lowering not yet implemented for this class
 
 
@@ -180,11 +186,11 @@ def lowering(node):
 	(all high level nodes can be lowered to lower-level representation'''
     try:
         check = node.lower()
-        print 'Lowering', type(node), id(node)
-        if not check:
-            print 'Failed!'
+        if tracer.ir >= DEBUG:
+            tracer.event('ir', 'lowering', node=type(node), id=id(node), ok=bool(check))
     except Exception, e:
-        print 'Cannot lower', type(node), e
+        if tracer.ir >= DEBUG:
+            tracer.event('ir', 'lowering_failed', node=type(node), error=e)
         pass  # lowering not yet implemented for this class
 
 
@@ -193,9 +199,8 @@ def flattening(node):
 	(only StatList nodes are actually flattened)'''
     try:
         check = node.flatten()
-        print 'Flattening', type(node), id(node)
-        if not check:
-            print 'Failed!'
+        if tracer.ir >= DEBUG:
+            tracer.event('ir', 'flattening', node=type(node), id=id(node), ok=bool(check))
     except Exception, e:
         # print type(node), e
         pass  # this type of node cannot be flattened
@@ -207,8 +212,6 @@ def dotty_wrapper(fout):
     def dotty_function(irnode, G):
         from string import split, join
         from ir import Stat, Symbol
-        attrs = set(['body', 'cond', 'thenpart', 'elsepart', 'call', 'step', 'expr', 'target', 'defs']) & set(
-            dir(irnode))
         # the name as the ID of the object
         res = str(id(irnode)) + ' ['
         label = ""
@@ -237,24 +240,17 @@ def dotty_wrapper(fout):
 
         res += '" ];\n'
 
-        if 'children' in dir(irnode) and len(irnode.children):
+        if hasattr(irnode, 'children') and len(irnode.children):
             for node in irnode.children:
                 G.edge(str(id(irnode)),str(id(node)))
                 res += str(id(irnode)) + ' -> ' + str(id(node)) + ' [pos=' + `irnode.children.index(node)` + '];\n'
                 if type(node) == str:
                     G.node(str(id(node)), node)
                     res += str(id(node)) + ' [label=' + node + '];\n'
-        for d in attrs:
+        for d in irnode.node_fields:
             node = getattr(irnode, d)
-            if d == 'target':
-                from ir import Register
-                if isinstance(node, Register):
-                    res += str(id(irnode)) + ' -> ' + str(id(node)) + ' [label=' + "jump to register_ra" + '];\n'
-                else:
-                    res += str(id(irnode)) + ' -> ' + str(id(node.value)) + ' [label=' + node.name + '];\n'
-            else:
-                G.edge(str(id(irnode)),str(id(node)))
-                res += str(id(irnode)) + ' -> ' + str(id(node)) + ';\n'
+            G.edge(str(id(irnode)),str(id(node)))
+            res += str(id(irnode)) + ' -> ' + str(id(node)) + ';\n'
         fout.write(res)
  
         return res
@@ -262,27 +258,26 @@ def dotty_wrapper(fout):
     return dotty_function
 
 
-def print_dotty(root, filename):
-    '''Print a graphviz dot representation to file'''
-    G = Digraph("IR representation")
-
-    fout = open(filename, "w")
-    fout.write("digraph G {\n")
-    node_list = get_node_list(root)
-    dotty = dotty_wrapper(fout)
-    
-    for n in node_list: dotty(n, G)
-    fout.write("}\n")
+def print_dotty(root, filename, view=False):
+    '''Print a graphviz dot representation to file
+    (with view the diagram is also rendered and opened)'''
+    # the graph is only built when it is drawn
+    G = Digraph("IR representation") if view else NullGraph()
 
-    G.render('ir.gv', view=True)
+    with open(filename, "w") as fout:
+        fout.write("digraph G {\n")
+        node_list = get_node_list(root)
+        dotty = dotty_wrapper(fout)
 
+        for n in node_list: dotty(n, G)
+        fout.write("}\n")
 
+    if view:
+        G.render('ir.gv', view=True)
 
-__DEBUG = True
 
 
-def debug(string):
-    if __DEBUG:
-        print '\033[46m' + string + '\033[0m'  # '\033[33m' +
-    else:
-        pass
+def debug(string, subsystem='driver', level=INFO):
+    '''Trace a message, hot paths should test the tracer level before building it'''
+    if getattr(tracer, subsystem) >= level:
+        tracer.message(subsystem, string)
@@ -1,5 +1,4 @@
-from graphviz import Digraph
-from texttable import Texttable
+from visualisation import Digraph, Texttable
 
 
 def rowify(symbol):
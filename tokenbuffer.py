@@ -0,0 +1,86 @@
+#!/usr/bin/python
+
+__doc__ = '''Array-backed token buffer
+Token kinds are stored as small integers and words are interned in a per-compilation string table,
+the parser reads the buffer by index so it can look ahead and parse the same buffer more than once.
+The buffer is filled with all the tokens before the parser starts: its memory is O(n) in the number of
+tokens, about 17 bytes per token on a 64-bit build (kind, offset and a reference to the interned word)
+plus the distinct words. The memory-mapped source of lexer.stream_lexer is not kept.'''
+
+from array import array
+from bisect import bisect_right
+
+from lexer import symbols, pack_position, unpack_position
+from logger import tracer, DEBUG
+
+# token kinds as small integers
+token_names = sorted(symbols.keys()) + ['ident', 'number']
+token_kinds = dict((name, kind) for kind, name in enumerate(token_names))
+
+
+class StringTable(dict):
+    '''Per-compilation string table: each distinct word is stored once'''
+
+    def intern(self, word):
+        return self.setdefault(word, word)
+
+
+class TokenBuffer(object):
+    def __init__(self, tokens=None, strings=None):
+        # parallel arrays, one entry per token
+        self.kinds = array('B')
+        self.offsets = array('L')
+        self.values = []
+
+        if strings is None:
+            strings = StringTable()
+        self.strings = strings
+
+        # first offset of every line holding a token,
+        # used to recover line and column from an offset
+        self.lines = array('L')
+        self.line_starts = array('L')
+
+        if tokens is not None:
+            self.extend(tokens)
+
+    def extend(self, tokens):
+        '''Append the (token, word, position) triples of a positioned lexer'''
+        kinds = self.kinds
+        offsets = self.offsets
+        values = self.values
+        intern = self.strings.intern
+        last_line = self.lines[-1] if len(self.lines) else 0
+        trace = tracer.lexer >= DEBUG
+        first = len(kinds)
+
+        for tok, word, position in tokens:
+            offset, line, column = unpack_position(position)
+            if trace:
+                tracer.event('lexer', 'token', token=tok, word=word, line=line, column=column)
+            kinds.append(token_kinds[tok])
+            offsets.append(offset)
+            values.append(intern(word))
+            if line != last_line:
+                self.lines.append(line)
+                self.line_starts.append(offset - column + 1)
+                last_line = line
+
+        if tracer.lexer:
+            tracer.event('lexer', 'tokens', count=len(kinds) - first, strings=len(self.strings))
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def name(self, idx):
+        '''Token name of the idx-th token'''
+        return token_names[self.kinds[idx]]
+
+    def value(self, idx):
+        return self.values[idx]
+
+    def position(self, idx):
+        '''Packed position (see lexer.pack_position) of the idx-th token'''
+        offset = self.offsets[idx]
+        l = bisect_right(self.line_starts, offset) - 1
+        return pack_position(offset, self.lines[l], offset - self.line_starts[l] + 1)
@@ -0,0 +1,81 @@
+#!/usr/bin/python
+
+__doc__ = '''Depth-first traversals with an explicit stack
+Shared by the walks of the IR trees and of the basic block graphs: the depth of
+a walk is bounded by the memory, not by the Python recursion limit.
+successors(node) returns the nodes below node, in visiting order. On graphs
+(unique=True) every node is visited once, the first time it is reached, as a
+recursive walk marking the nodes on entry would do; on trees (unique=False)
+a node reachable along two paths is visited twice.'''
+
+# events of depth_first
+ENTER = 'enter'
+LEAVE = 'leave'
+# edge to a node already entered
+REVISIT = 'revisit'
+
+
+def preorder(root, successors, unique=True):
+    '''Nodes in pre-order. The successors of a node are asked for after the
+    node is yielded, so the caller may still change them'''
+    seen = set()
+    stack = [root]
+    pop = stack.pop
+    extend = stack.extend
+    while stack:
+        node = pop()
+        if unique:
+            if node in seen:
+                continue
+            seen.add(node)
+        yield node
+        extend(reversed(successors(node)))
+
+
+def postorder(root, successors, unique=True):
+    '''Nodes in post-order. The successors of a node are taken when the node
+    is reached, before the nodes below it are yielded'''
+    seen = set([root])
+    stack = [(root, iter(successors(root)))]
+    while stack:
+        node, children = stack[-1]
+        for child in children:
+            if unique:
+                if child in seen:
+                    continue
+                seen.add(child)
+            stack.append((child, iter(successors(child))))
+            break
+        else:
+            stack.pop()
+            yield node
+
+
+def reverse_postorder(root, successors):
+    '''List of the nodes of a graph in reverse post-order'''
+    res = list(postorder(root, successors))
+    res.reverse()
+    return res
+
+
+def depth_first(root, successors):
+    '''Events of a depth-first walk of a graph, as (event, node, parent) triples:
+    ENTER when the walk reaches a node for the first time, REVISIT for an edge
+    from parent to a node already entered, LEAVE once all the successors of the
+    node have been walked'''
+    seen = set([root])
+    yield ENTER, root, None
+    stack = [(root, None, iter(successors(root)))]
+    while stack:
+        node, parent, children = stack[-1]
+        for child in children:
+            if child in seen:
+                yield REVISIT, child, node
+                continue
+            seen.add(child)
+            yield ENTER, child, node
+            stack.append((child, node, iter(successors(child))))
+            break
+        else:
+            stack.pop()
+            yield LEAVE, node, parent
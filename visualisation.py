@@ -0,0 +1,50 @@
+#!/usr/bin/python
+
+__doc__ = '''Optional visualisation layer
+graphviz and texttable are only needed to draw diagrams and tables: they are
+imported on first use, so headless compilations neither pay for the imports
+nor need the packages installed.'''
+
+# package that provides each class
+PROVIDERS = {
+    'Digraph': 'graphviz',
+    'Graph': 'graphviz',
+    'Texttable': 'texttable',
+}
+
+loaded = dict()
+
+
+def load(name):
+    '''Return the class name of its package, importing it the first time'''
+    try:
+        return loaded[name]
+    except KeyError:
+        pass
+    package = PROVIDERS[name]
+    try:
+        module = __import__(package)
+    except ImportError:
+        raise ImportError("the " + package + " package is needed for the visualisations (pip install " +
+                          package + ")")
+    loaded[name] = getattr(module, name)
+    return loaded[name]
+
+
+def Digraph(*args, **kwargs):
+    return load('Digraph')(*args, **kwargs)
+
+
+def Graph(*args, **kwargs):
+    return load('Graph')(*args, **kwargs)
+
+
+def Texttable(*args, **kwargs):
+    return load('Texttable')(*args, **kwargs)
+
+
+class NullGraph(object):
+    '''Stands for a graph that is never drawn, every call is ignored'''
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None